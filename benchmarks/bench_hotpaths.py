@@ -0,0 +1,127 @@
+#%%
+# Microbenchmarks of the analysis and synthesis hot paths: BifurcationODE, BirdSong.__init__,
+# BirdSong.Syllables, Syllable.__init__ (and its lazy features), MotorGestures at several ovfs and
+# durations and SynthScores. Runs offline on the bundled XC388622 recording and on generated chirps.
+# The medians are written as json, two runs (e.g. two commits) are compared with --compare.
+# Run from the repository root:
+#   python benchmarks/bench_hotpaths.py [--repeat 5] [--precision float32] [--output file.json]
+#   python benchmarks/bench_hotpaths.py --compare old.json new.json
+import sys, time, json, argparse, platform, subprocess, warnings
+from datetime import datetime
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+from birdsongs import Paths, BirdSong, Syllable, SetPrecision
+from birdsongs.util import BifurcationODE
+from birdsongs.engines import numba
+
+F1 = "ys"
+F2 = "(-alpha-beta*xs-xs**3+xs**2)*gamma**2 -(xs+1)*gamma*xs*ys"
+OVFS      = (5, 10, 20)
+DURATIONS = (0.05, 0.1, 0.2)   # s, generated chirps
+FS        = 44100
+
+def Timeit(fun, *args, repeat=5, setup=None, warmup=1):
+    # median and minimum wall time (s), setup (not timed) runs before each call and the
+    # warmup calls (numba compilation, disk caches) are not timed
+    times = []
+    for i in range(warmup+repeat):
+        if setup is not None: setup()
+        start = time.perf_counter(); fun(*args); seconds = time.perf_counter()-start
+        if i>=warmup: times.append(seconds)
+    return {"median":float(np.median(times)), "min":float(np.min(times)), "repeat":repeat}
+
+def Chirp(T, fs=FS, f0=2e3, f1=5e3):
+    # harmonic frequency sweep with a smooth amplitude, a syllable-like signal
+    t     = np.arange(int(T*fs))/fs
+    phase = 2*np.pi*(f0*t+0.5*(f1-f0)*t**2/T)
+    return np.sin(np.pi*t/T)**2*(np.sin(phase)+0.3*np.sin(2*phase))
+
+def ChirpSyllable(T, NN=512):
+    syllable = Syllable(sfs=[Chirp(T), FS], NN=NN, t0_bs=0, cache=False)
+    syllable.AlphaBeta()
+    return syllable
+
+def Features(syllable):
+    return [getattr(syllable, name) for name in ("FF", "SCI", "mfccs", "Sxx", "s_mel", "rms", "centroid")]
+
+def Commit():
+    try:    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+#%%
+def Run(repeat=5):
+    results = {}
+    def Add(name, timing, **info):
+        results[name] = dict(timing, **info)
+        print("{:<40}{:>12.3f}{:>12.3f}".format(name, 1e3*timing["median"], 1e3*timing["min"]))
+
+    print("{:<40}{:>12}{:>12}".format("benchmark", "median (ms)", "min (ms)"))
+    # ------------- bifurcation curves, symbolic (no cache) and cached -------------
+    Add("BifurcationODE", Timeit(BifurcationODE, F1, F2, False, repeat=max(1, repeat//2)))
+    Add("BifurcationODE cached", Timeit(BifurcationODE, F1, F2, True, repeat=repeat))
+
+    # ------------- recording analysis -------------
+    paths = Paths(str(ROOT/"examples")+"/")
+    Add("BirdSong.__init__", Timeit(BirdSong, paths, "XC388622", [], 0.05, 1., 512, repeat=repeat),
+        file_id="XC388622", NN=512)
+    bird = BirdSong(paths, file_id="XC388622", NN=512, tlim=(0,2))
+    Add("BirdSong.__init__ tlim", Timeit(lambda: BirdSong(paths, file_id="XC388622", NN=512, tlim=(0,2)), repeat=repeat),
+        file_id="XC388622", NN=512, tlim=[0,2])
+    # Syllables reads FF, the features are dropped before each call so every run computes them
+    Add("BirdSong.Syllables", Timeit(bird.Syllables, repeat=repeat, setup=lambda: bird.__dict__.pop("FF", None)),
+        tlim=[0,2])
+    Add("Syllable.__init__", Timeit(lambda: Syllable(bird, tlim=(0.1,0.2), NN=512), repeat=repeat), T=0.1)
+    Add("Syllable.__init__ + features", Timeit(lambda: Features(Syllable(bird, tlim=(0.1,0.2), NN=512)), repeat=repeat), T=0.1)
+
+    # ------------- synthesis, generated signals -------------
+    for T in DURATIONS:
+        syllable = ChirpSyllable(T)
+        for ovfs in OVFS:
+            Add("MotorGestures T={} ovfs={}".format(T, ovfs),
+                Timeit(syllable.MotorGestures, syllable.alpha, syllable.beta, syllable.p["gm"].value, ovfs,
+                       repeat=repeat), T=T, ovfs=ovfs, engine=syllable.engine)
+
+    syllable = ChirpSyllable(0.1)
+    out      = syllable.Trajectory(syllable.alpha, syllable.beta, syllable.p["gm"].value)[0]
+    Features(syllable)
+    for scores in (None, ["scoreFF"]):
+        name = "SynthScores {}".format("all" if scores is None else "+".join(scores))
+        # a new synthetic syllable per run, its features are part of the scores cost
+        Add(name, Timeit(lambda: syllable.SynthScores(syllable.SynthSyllable(out), scores=scores), repeat=repeat), T=0.1)
+
+    return results
+
+def Compare(old_file, new_file):
+    old, new = [json.load(open(file)) for file in (old_file, new_file)]
+    print("{} ({}) -> {} ({})".format(old_file, old["commit"], new_file, new["commit"]))
+    print("{:<40}{:>12}{:>12}{:>10}".format("benchmark", "old (ms)", "new (ms)", "speedup"))
+    for name in old["results"]:
+        if name not in new["results"]: continue
+        t_old, t_new = old["results"][name]["median"], new["results"][name]["median"]
+        print("{:<40}{:>12.3f}{:>12.3f}{:>10.2f}".format(name, 1e3*t_old, 1e3*t_new, t_old/t_new))
+
+#%%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the birdsongs hot paths")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--precision", default=None, choices=["float64", "float32"], help="default: the loaded dtypes")
+    parser.add_argument("--output", default=None, help="json file, default benchmarks/results/hotpaths-<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two json results")
+    args = parser.parse_args()
+
+    if args.compare is not None: Compare(*args.compare)
+    else:
+        commit  = Commit()
+        SetPrecision(args.precision)
+        results = Run(repeat=args.repeat)
+        output  = Path(args.output) if args.output else ROOT/"benchmarks"/"results"/"hotpaths-{}.json".format(commit)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        json.dump({"commit":commit, "date":datetime.now().isoformat(timespec="seconds"),
+                   "numba":numba.__version__ if numba is not None else None, "numpy":np.__version__,
+                   "python":platform.python_version(), "machine":platform.machine(), "repeat":args.repeat,
+                   "precision":args.precision, "results":results}, open(output, "w"), indent=2)
+        print("results saved in", output)
@@ -0,0 +1,146 @@
+#%%
+# End to end throughput of Optimizer.SongByTimes on a ground truth synthetic song. The syllables are
+# synthesized with known coefficients over FF shapes of the bundled XC388622 recording, then the whole
+# pipeline (γ* and the a, b coefficients of each syllable) fits them again. Reports the wall time,
+# syllables per hour, peak RSS, the scores of the fits and the error of the fitted motor gestures, and
+# fails (exit code 1) when a threshold is not met, so it can gate a release on speed and accuracy.
+# The fit uses the FF shape of the synthetic syllables as beta basis, not the one of the template (and
+# it does not converge to a common one), so the accuracy is measured on the alpha(t) and beta(t)
+# curves and on the scores, the coefficient errors are only informative.
+# Run from the repository root:
+#   python benchmarks/bench_pipeline.py [--Ngm 5] [--Nba 7] [--workers 1] [--precision float32] [--output file.json]
+#                                       [--min-rate 60] [--max-time 600] [--max-rss 2000] [--max-error 0.1]
+#                                       [--max-score 0.05]
+import sys, time, json, argparse, contextlib, io, resource, platform, subprocess, warnings
+from datetime import datetime
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+from birdsongs import Paths, BirdSong, Syllable, Optimizer, SetPrecision
+
+TLIM  = (0, 3.5)                                    # s, part of XC388622 used as template
+TIMES = [[0.20, 0.30], [0.40, 0.50], [3.05, 3.15], [3.25, 3.35]]   # syllable intervals
+GAMMA = 4e4                                         # time scale constant, the same for the whole song
+# coefficients of each syllable, the ones SongByTimes fits (OptimalAs and OptimalBs)
+TRUTH = [{"a0":0.10, "b0":-0.20, "b1":1.0, "b2":0.2},
+         {"a0":0.15, "b0":-0.10, "b1":0.6, "b2":0.0},
+         {"a0":0.08, "b0":-0.30, "b1":1.4, "b2":0.4},
+         {"a0":0.12, "b0":-0.15, "b1":0.8, "b2":0.1}]
+NN = 512
+
+def Commit():
+    try:    return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def PeakRSS():
+    # MB, this process and its (finished) workers, ru_maxrss is in KB on linux and bytes on macOS
+    scale = 1 if sys.platform=="darwin" else 1024
+    return max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))*scale/2**20
+
+def GroundTruth(paths):
+    # song with the TRUTH syllables synthesized at TIMES, silence elsewhere, and their alpha and beta
+    template = BirdSong(paths, file_id="XC388622", NN=NN, tlim=TLIM)
+    song, alphas, betas = np.zeros_like(template.s), np.zeros(template.s.size), np.zeros(template.s.size)
+    for tlim, truth in zip(TIMES, TRUTH):
+        syllable = Syllable(template, tlim=tlim, Nt=30, NN=NN)
+        synth    = syllable.Solve(Parameters(syllable, truth), scores=[])
+        index    = slice(int(tlim[0]*template.fs), int(tlim[0]*template.fs)+synth.s.size)
+        song[index], alphas[index], betas[index] = synth.s, synth.alpha, synth.beta
+    return BirdSong(paths, file_id="XC388622", sfs=[song, template.fs], NN=NN), alphas, betas, syllable.p
+
+def Parameters(syllable, coefficients, gamma=GAMMA):
+    p = syllable.p.copy();  p["gm"].set(value=gamma)
+    for key, value in coefficients.items(): p[key].set(value=value)
+    return p
+
+def Scores(song, ps):
+    # scoreFF of the parameters ps over the syllables of the song, as SongByTimes defines them
+    return [float(Syllable(song, tlim=tlim, Nt=30, NN=NN).Solve(p, scores=["scoreFF"]).scoreFF) for tlim, p in zip(TIMES, ps)]
+
+def Errors(optimizer, alphas, betas, p):
+    # median absolute error of the fitted motor gestures over each syllable (the FF shape polynomial of
+    # beta can spike at the edges), and the absolute error of each fitted coefficient over the range of
+    # its parameter (bounds of p)
+    curves = {"alpha":[], "beta":[]}
+    for tlim in TIMES:
+        index = slice(int(tlim[0]*optimizer.obj0.fs), int(tlim[1]*optimizer.obj0.fs))
+        curves["alpha"].append(np.median(np.abs(optimizer.alphas[index]-alphas[index])))
+        curves["beta"].append(np.median(np.abs(optimizer.betas[index]-betas[index])))
+    coefficients = {key:[] for key in ["gm"]+list(TRUTH[0])}
+    for fit, truth in zip(optimizer.ps, TRUTH):
+        for key, value in truth.items(): coefficients[key].append(abs(fit[key].value-value)/(p[key].max-p[key].min))
+        coefficients["gm"].append(abs(fit["gm"].value-GAMMA)/(p["gm"].max-p["gm"].min))
+    return ({key:float(np.max(value)) for key, value in curves.items()},
+            {key:float(np.max(value)) for key, value in coefficients.items()})
+
+#%%
+def Run(Ngm=5, Nba=7, workers=1, verbose=False):
+    paths   = Paths(str(ROOT/"examples")+"/")
+    song, alphas, betas, p = GroundTruth(paths)
+    optimizer = Optimizer(song, {"method":"brute", "Ns":Nba})
+
+    log = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with log: optimizer.SongByTimes(TIMES, Ngm=Ngm, Nba=Nba, NN=NN, workers=workers)
+    seconds = time.perf_counter()-start
+
+    rss    = PeakRSS()
+    errors, coefficients = Errors(optimizer, alphas, betas, p)
+    with log:   # the truth scores are the reference of the fitted ones, what the beta basis of the fit allows
+        scores = Scores(song, optimizer.ps)
+        truth  = Scores(song, [Parameters(Syllable(song, tlim=tlim, Nt=30, NN=NN), coefs) for tlim, coefs in zip(TIMES, TRUTH)])
+    return {"seconds":seconds, "syllables":len(TIMES), "syllables_per_hour":3600*len(TIMES)/seconds,
+            "peak_rss_mb":rss, "errors":errors, "max_error":max(errors.values()), "coefficient_errors":coefficients,
+            "scoreFF":scores, "max_score":max(scores), "truth_scoreFF":truth,
+            "skipped":optimizer.skipped, "Ngm":Ngm, "Nba":Nba, "workers":workers}
+
+def Gate(result, min_rate=None, max_time=None, max_rss=None, max_error=None, max_score=None):
+    # failed thresholds, None ones are not checked
+    checks = [("syllables_per_hour", min_rate,  lambda x, y: x>=y),
+              ("seconds",            max_time,  lambda x, y: x<=y),
+              ("peak_rss_mb",        max_rss,   lambda x, y: x<=y),
+              ("max_error",          max_error, lambda x, y: x<=y),
+              ("max_score",          max_score, lambda x, y: x<=y)]
+    return ["{}={:.4g} (threshold {})".format(name, result[name], threshold)
+            for name, threshold, ok in checks if threshold is not None and not ok(result[name], threshold)]
+
+#%%
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End to end throughput and accuracy of Optimizer.SongByTimes")
+    parser.add_argument("--Ngm", type=int, default=5, help="brute grid points of γ")
+    parser.add_argument("--Nba", type=int, default=7, help="brute grid points of the a, b coefficients")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--precision", default=None, choices=["float64", "float32"], help="default: the loaded dtypes")
+    parser.add_argument("--verbose", action="store_true", help="show the optimizer output")
+    parser.add_argument("--output", default=None, help="json file, default benchmarks/results/pipeline-<commit>.json")
+    parser.add_argument("--min-rate", type=float, default=None, help="minimum syllables per hour")
+    parser.add_argument("--max-time", type=float, default=None, help="maximum wall time (s)")
+    parser.add_argument("--max-rss", type=float, default=None, help="maximum peak RSS (MB)")
+    parser.add_argument("--max-error", type=float, default=None, help="maximum median absolute error of the fitted alpha(t) and beta(t)")
+    parser.add_argument("--max-score", type=float, default=None, help="maximum scoreFF of the fitted syllables")
+    args = parser.parse_args()
+
+    commit = Commit()
+    SetPrecision(args.precision)
+    result = Run(Ngm=args.Ngm, Nba=args.Nba, workers=args.workers, verbose=args.verbose)
+    print("{} syllables in {:.2f} s: {:.1f} syllables/hour, peak RSS {:.0f} MB, {} silent candidates skipped".format(
+          result["syllables"], result["seconds"], result["syllables_per_hour"], result["peak_rss_mb"], result["skipped"]))
+    print("motor gestures median absolute error: " + ", ".join("{}={:.4f}".format(k, v) for k, v in result["errors"].items()))
+    print("scoreFF of the fits: {}, of the truth: {}".format(np.round(result["scoreFF"], 4), np.round(result["truth_scoreFF"], 4)))
+    print("coefficient error (fraction of the range, informative): " +
+          ", ".join("{}={:.3f}".format(k, v) for k, v in result["coefficient_errors"].items()))
+
+    output = Path(args.output) if args.output else ROOT/"benchmarks"/"results"/"pipeline-{}.json".format(commit)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    json.dump({"commit":commit, "date":datetime.now().isoformat(timespec="seconds"), "numpy":np.__version__,
+               "python":platform.python_version(), "machine":platform.machine(),
+               "precision":args.precision, "result":result}, open(output, "w"), indent=2)
+    print("results saved in", output)
+
+    failed = Gate(result, args.min_rate, args.max_time, args.max_rss, args.max_error, args.max_score)
+    if len(failed)!=0:
+        print("FAILED: " + "; ".join(failed))
+        sys.exit(1)
@@ -0,0 +1,64 @@
+#%%
+# Microbenchmark of the vectorized f_msf and acoustic dissimilarity (correlation, Df, SKL)
+# against the frame by frame loops, using the bundled XC388622 recording. Also checks that the
+# correlation of a syllable with itself (single precision mfccs) has no NaN frames.
+# Run from the repository root:  python benchmarks/bench_scores.py
+import sys, time, warnings
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+warnings.filterwarnings("ignore")
+
+import numpy as np
+from numpy.linalg import norm as Norm
+from birdsongs import Paths, BirdSong, Syllable
+
+def FmsfLoop(obj):
+    return np.array([Norm(obj.FF_coef[:,i]*obj.freq, 1)/Norm(obj.FF_coef[:,i], 1) for i in range(obj.FF_coef.shape[1])])
+
+def FmsfArray(obj):
+    return Syllable.f_msf.func(obj)   # cached_property body, uncached
+
+def DissimilarityLoop(obj, synth):
+    correlation, Df, SKL = np.zeros_like(obj.time), np.zeros_like(obj.time), np.zeros_like(obj.time)
+    for i in range(synth.mfccs.shape[1]):
+        x, y = obj.mfccs[:,i], synth.mfccs[:,i]
+        r = Norm(x*y,ord=1)/(Norm(x,ord=2)*Norm(y,ord=2))
+        correlation[i] = np.sqrt(1-r)
+        Df[i]          = 0.5*Norm(x*np.log2(np.abs(x/y))+y*np.log2(np.abs(y/x)), ord=1)
+        SKL[i]         = 0.5*Norm(np.abs(x-y), ord=1)
+    return correlation, Df/Df.max(), SKL/SKL.max()
+
+def DissimilarityArray(obj, synth):
+    synth = obj.SynthScores(synth, scores=["scoreCorrelation"])
+    return synth.correlation, synth.Df, synth.SKL
+
+def SelfCorrelation(obj):
+    # correlation of the syllable with itself, its float32 mfccs round r above 1 on some frames
+    return obj.SynthScores(obj.SynthSyllable(obj.s), scores=["scoreCorrelation"]).correlation
+
+def Timeit(fun, *args, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter(); fun(*args); times.append(time.perf_counter()-start)
+    return np.median(times)
+
+#%%
+if __name__ == "__main__":
+    paths    = Paths("examples/")
+    bird     = BirdSong(paths, file_id="XC388622", NN=512, tlim=(0,2))
+    syllable = Syllable(bird, tlim=(0.1,0.15), NN=512)
+    synth    = syllable.Solve(syllable.p, scores=[])
+
+    print("{:<16}{:>12}{:>12}{:>10}{:>12}".format("metric", "loop (ms)", "array (ms)", "speedup", "max |diff|"))
+    for name, loop, array, args in [("f_msf",         FmsfLoop,          FmsfArray,          (syllable,)),
+                                    ("dissimilarity", DissimilarityLoop, DissimilarityArray, (syllable, synth))]:
+        old, new = np.array(loop(*args)), np.array(array(*args))
+        # same numbers, nans in the same places
+        assert np.array_equal(np.isnan(old), np.isnan(new)) and np.allclose(old, new, rtol=1e-12, equal_nan=True)
+        t_loop, t_array = Timeit(loop, *args), Timeit(array, *args)
+        print("{:<16}{:>12.3f}{:>12.3f}{:>10.1f}{:>12.2e}".format(name, 1e3*t_loop, 1e3*t_array, t_loop/t_array,
+                                                              np.nanmax(np.abs(old-new))))
+
+    correlation = SelfCorrelation(syllable)
+    assert syllable.mfccs.dtype==np.complex64 and np.all(np.isfinite(correlation)) and np.max(correlation)<1e-3
+    print("self correlation of the float32 syllable: finite, max {:.2e}".format(np.max(correlation)))
@@ -1,9 +1,10 @@
 from .version import __version__
 from .birdsong import BirdSong
-from .syllable import Syllable, Amphibious
+from .syllable import Syllable, Amphibious, Reference, SolveReference, SynthResult
 from .optimizer import Optimizer
 from .paths import Paths
 from .ploter import Ploter
+from .engines import GetEngine, RegisterEngine
 from .util import (   
                     rk4, 
                     WriteAudio, 
@@ -16,6 +17,12 @@ from .util import (
                     DownloadXenoCanto,
                     grab_audio,
                     BifurcationODE,
+                    SolveCache,
+                    SetPrecision,
+                    FitDatabase,
+                    InferenceModel,
+                    Profiler,
+                    Timed,
                     DefineSyllable,
                     DefineWholeSyllable
                   )
@@ -24,10 +31,15 @@ __all__ = [
             'BirdSong', 
             'Syllable',
             'Amphibious',
+            'Reference',
+            'SolveReference',
+            'SynthResult',
             'Optimizer',
             'Paths',
             'Ploter',
             'Optimizer',
+            'GetEngine',
+            'RegisterEngine',
             'rk4', 
             'WriteAudio', 
             'Enve', 
@@ -39,6 +51,12 @@ __all__ = [
             'DownloadXenoCanto',
             'grab_audio',
             'BifurcationODE',
+            'SolveCache',
+            'SetPrecision',
+            'FitDatabase',
+            'InferenceModel',
+            'Profiler',
+            'Timed',
             "DefineSyllable",
             "DefineWholeSyllable"
           ]
\ No newline at end of file
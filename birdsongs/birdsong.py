@@ -44,6 +44,7 @@ class BirdSong(Syllable, object):
             self.s  = sound.normalize(s[int(tlim[0]*fs):int(tlim[1]*fs)], max_amp=1.0)
             self.t0 = tlim[0]
             self.tlim = tlim
+        self.s = AsPrecision(self.s)   # the spectral features follow its dtype
         
         self.NN         = NN
         self.win_length = self.NN//2
@@ -57,7 +58,7 @@ class BirdSong(Syllable, object):
         self.SylInd   = []
         self.fs       = fs
         self.time_s   = np.linspace(0, len(self.s)/self.fs, len(self.s))
-        self.envelope = Enve(self.s, self.fs, Nt=Nt)
+        self.envelope = Enve(self.s, self.fs, Nt=Nt)   # float64, it drives the integration
         
         self.stft = librosa.stft(y=self.s, n_fft=self.NN, hop_length=self.hop_length, win_length=self.NN, window='hann',
                                  center=self.center, dtype=None, pad_mode='constant')
@@ -67,9 +68,9 @@ class BirdSong(Syllable, object):
                                         center=self.center, reassign_frequencies=True, reassign_times=True,
                                         ref_power=1e-06, fill_nan=True, clip=True, dtype=None, pad_mode='constant')
         
-        self.freqs   = freqs  
-        self.times   = times 
-        self.Sxx     = mags 
+        self.freqs   = AsPrecision(freqs)
+        self.times   = AsPrecision(times)
+        self.Sxx     = AsPrecision(mags)
         self.Sxx_dB  = librosa.amplitude_to_db(mags, ref=np.max)
         self.freq    = librosa.fft_frequencies(sr=self.fs, n_fft=self.NN) 
         self.time    = librosa.times_like(X=self.stft,sr=self.fs, hop_length=self.hop_length, n_fft=self.NN) #, axis=-1
@@ -0,0 +1,581 @@
+import inspect, os, warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.signal import lfilter
+
+try:
+    import numba
+except ImportError:  # numba is optional, the python engine is always available
+    numba = None
+
+from .util import rk4
+
+#%%
+# ---------------------- trajectory recording ---------------------------
+# names of the state variables of each model, record_vars can use names or indexes
+STATE_VARS = {"bird": ["x", "y", "pout", "i1", "i2", "i3"], "amphibious": ["x", "y", "pout"]}
+RECORD_OFF, RECORD_FULL, RECORD_AUDIO = 0, 1, 2
+
+def RecordBuffer(record, samples, ovfs, model="bird", record_vars=None, record_dtype=np.float64):
+    """
+    Allocate the array where an engine records the trajectory (Vs)
+    INPUT:
+        record       = None/"off" (no recording), "full" (every rk4 state, samples*ovfs rows) or 
+                       "audio" (decimated, the state at the end of each audio sample, samples rows)
+        record_vars  = state variables to record (names or indexes), None for all of them
+        record_dtype = dtype of the recorded states, e.g. np.float32
+    OUTPUT:
+        mode = RECORD_OFF, RECORD_FULL or RECORD_AUDIO
+        vars = indexes of the recorded variables
+        Vs   = empty array to fill, None when the recording is off
+    """
+    names = STATE_VARS[model]
+    if record_vars is None: record_vars = range(len(names))
+    vars = np.array([names.index(v) if isinstance(v, str) else int(v) for v in record_vars], dtype=np.int64)
+    
+    if record in (None, False, "off", "none"):  return RECORD_OFF, vars, None
+    elif record in (True, "full"):              rows, mode = samples*ovfs, RECORD_FULL
+    elif record in ("audio", "decimate"):       rows, mode = samples, RECORD_AUDIO
+    else: raise ValueError("Unknown record policy '{}', use None, 'full' or 'audio'.".format(record))
+    
+    return mode, vars, np.empty((rows, vars.size), dtype=record_dtype)
+
+def TimesVs(record, T, samples, ovfs):
+    # time of each recorded row for a syllable of duration T
+    if   record in (True, "full"):         return np.linspace(0, T, samples*ovfs)
+    elif record in ("audio", "decimate"):  return np.linspace(0, T, samples)
+    else:                                  return None
+
+#%%
+def MotorGesturesPython(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                        record_vars=None, record_dtype=np.float64):
+    """
+    Reference (pure python) integration of the motor gestures model: labia, trachea and OEC
+    INPUT:
+        f1, f2   = labia ODEs, x'=f1(x,y,alpha,beta,gamma) and y'=f2(x,y,alpha,beta,gamma)
+        alpha    = air-sac pressure array, one value per audio sample
+        beta     = labial tension array, one value per audio sample
+        gamma    = time scale constant
+        envelope = envelope of the real syllable, one value per audio sample
+        fs       = sampling rate
+        BirdData = dictionary with the model constants (C, L, r, Ch, MG, MB, RB, Rh)
+        ovfs     = oversampling factor of the integration
+        record, record_vars, record_dtype = trajectory recording policy, see RecordBuffer
+    OUTPUT:
+        out = synthetic signal at fs
+        Vs  = recorded rk4 states, shape (samples*ovfs, 6) with record="full", None if it is off
+    """
+    samples = int(np.size(alpha))
+    t, tmax, dt = 0, samples*ovfs-1, 1./(ovfs*fs) # t0, tmax, td
+    # initial vector ODEs (v0), it is not too relevant
+    v = 1e-4*np.array([1e2, 1e1, 1, 1, 1, 1]);
+    mode, vars, Vs = RecordBuffer(record, samples, ovfs, "bird", record_vars, record_dtype)
+    if mode==RECORD_FULL: Vs[0] = v[vars]
+    # ------------- BIRD PARAMETERS -----------
+    c, L, r, Ch = BirdData['C'], BirdData['L'], BirdData['r'], BirdData['Ch']
+    MG, MB, RB, Rh  = BirdData['MG'], BirdData['MB'], BirdData['RB'], BirdData['Rh']
+    # pback and pin delay lines: ring buffers of the last D = L/c/dt steps, slot t%D holds t-D
+    D = int(L/c/dt)
+    pi, pb, out = np.zeros(D), np.zeros(D), np.zeros(samples)
+    # - Trachea:
+    #           r: reflection coeficient    [adimensionelss]
+    #           L: trachea length           [m]
+    #           c: speed of sound in media  [m/s]
+    # - Beak, Glottis and OEC:
+    #           CH: OEC Compliance          [m^3/Pa]
+    #           MB: Beak Inertance          [Pa s^2/m^3 = kg/m^4]
+    #           MG: Glottis Inertance       [Pa s^2/m^3 = kg/m^4]
+    #           RB: Beak Resistance         [Pa s/m^3 = kg/m^4 s]
+    #           Rh: OEC Resistence          [Pa s/m^3 = kg/m^4 s]
+    # ------------------------------ ODEs -----------------------------
+    def ODEs(v):
+        nonlocal pit, pbt
+        dv, [x, y, pout, i1, i2, i3] = np.zeros(6), v  # (x, y, pout, i1, i2, i3)'
+        # ----------------- direct implementation of the EDOs -----------
+        dv[0] = f1(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
+        dv[1] = f2(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
+        # ------------------------- trachea ------------------------
+        pbold = pbt                                   # pressure back before
+        # Pin(t) = Ay(t)+pback(t-L/C) = envelope_Signal*v[1]+pb[t-L/C/dt]
+        pit   = (.5*envelope[t//ovfs])*dv[1] + pb_D
+        pbt   = -r*pi_D                               # pressure back after: -rPin(t-L/C)
+        pout  = (1-r)*pi_D                            # pout
+        # ---------------------------------------------------------------
+        dv[2] = (pbt-pbold)/dt                        # dpout
+        dv[3] = i2
+        dv[4] = -(1/Ch/MG)*i1 - Rh*(1/MB+1/MG)*i2 +(1/MG/Ch+Rh*RB/MG/MB)*i3 \
+                +(1/MG)*dv[2] + (Rh*RB/MG/MB)*pout
+        dv[5] = -(MG/MB)*i2 - (Rh/MB)*i3 + (1/MB)*pout
+        return dv
+    # ----------------------- Solving EDOs ----------------------
+    while t < tmax: # and v[1] > -5e6:  # labia velocity not too fast
+        pi_D, pb_D, pit, pbt = pi[t%D], pb[t%D], 0., 0.   # pin and pback at t-L/C
+        v = rk4(ODEs, v, dt)                  # RK4 - step
+        pi[t%D], pb[t%D] = pit, pbt           # pin(t) and pback(t), read again at t+L/C
+        if   mode==RECORD_FULL:  Vs[t+1]     = v[vars]
+        elif mode==RECORD_AUDIO: Vs[t//ovfs] = v[vars]
+        out[t//ovfs] = RB*v[-1]               # output signal (synthetic)
+        t += 1;
+
+    return out, Vs
+
+#%%
+def AmphibiousPython(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                     record_vars=None, record_dtype=np.float64):
+    """
+    Reference (pure python) integration of the amphibious model: labia and trachea, without OEC
+    INPUT and OUTPUT as MotorGesturesPython, Vs has shape (samples*ovfs, 3)
+    """
+    samples = int(np.size(alpha))
+    t, tmax, dt = 0, samples*ovfs-1, 1./(ovfs*fs) # t0, tmax, td
+    v = 1e-4*np.array([1e2, 1e1, 1]);
+    mode, vars, Vs = RecordBuffer(record, samples, ovfs, "amphibious", record_vars, record_dtype)
+    if mode==RECORD_FULL: Vs[0] = v[vars]
+    c, L, r = BirdData['C'], BirdData['L'], BirdData['r']
+    D = int(L/c/dt)                                   # trachea delay, ring buffers as MotorGesturesPython
+    pi, pb, out = np.zeros(D), np.zeros(D), np.zeros(samples)
+
+    def ODEs(v):
+        nonlocal pit, pbt
+        dv, [x, y, pout] = np.zeros(3), v  # (x, y, pout)'
+        dv[0] = f1(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
+        dv[1] = f2(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
+        # ------------------------- trachea ------------------------
+        pbold = pbt                                   # pressure back before
+        pit   = (.5*envelope[t//ovfs])*dv[1] + pb_D
+        pbt   = -r*pi_D                               # pressure back after: -rPin(t-L/C)
+        pout  = (1-r)*pi_D                            # pout
+        dv[2] = (pbt-pbold)/dt                        # dpout
+        return dv
+
+    while t < tmax:
+        pi_D, pb_D, pit, pbt = pi[t%D], pb[t%D], 0., 0.
+        v = rk4(ODEs, v, dt)                  # RK4 - step
+        pi[t%D], pb[t%D] = pit, pbt
+        if   mode==RECORD_FULL:  Vs[t+1]     = v[vars]
+        elif mode==RECORD_AUDIO: Vs[t//ovfs] = v[vars]
+        out[t//ovfs] = v[-1]                  # output signal (synthetic)
+        t += 1;
+
+    return out, Vs
+
+#%%
+# ----------------------- compiled (numba) engine ----------------------
+# The kernels below are a line by line translation of the python engines without
+# per step allocations. Inside one rk4 step the python closure rewrites pin and pback
+# in each of the four evaluations, so pbt-pbold is only non zero in the first one
+# and pin keeps the value of the last one; the kernels reproduce that exactly.
+_KERNELS = {}
+
+def _Source(f):
+    try:                         return inspect.getsource(f)
+    except (OSError, TypeError): return str(id(f))
+
+def _BirdKernel(f1, f2):
+    key = ("bird", _Source(f1), _Source(f2))
+    if key in _KERNELS: return _KERNELS[key]
+
+    f1_jit, f2_jit = numba.njit(f1), numba.njit(f2)
+
+    @numba.njit(cache=False, nogil=True)   # without the GIL, the batch runs it in threads
+    def kernel(alpha, beta, gamma, envelope, ovfs, dt, c, L, r, Ch, MG, MB, RB, Rh, mode, vars, Vs):
+        samples = alpha.size
+        tmax    = samples*ovfs-1
+        D       = int(L/c/dt)                   # trachea delay in steps
+        pi, pb  = np.zeros(D), np.zeros(D)      # ring buffers, slot t%D holds t-D
+        out     = np.zeros(samples)
+        v       = 1e-4*np.array([1e2, 1e1, 1., 1., 1., 1.])
+        if mode==1:
+            for m in range(vars.size): Vs[0,m] = v[vars[m]]
+
+        A41, A42 = -(1/Ch/MG), - Rh*(1/MB+1/MG)
+        A43, A44 = (1/MG/Ch+Rh*RB/MG/MB), (Rh*RB/MG/MB)
+        A51, A52, A53 = -(MG/MB), (Rh/MB), (1/MB)
+        k  = np.empty((4, 6))
+        vk = np.empty(6)
+        for t in range(tmax):
+            a, b, e = alpha[t//ovfs], beta[t//ovfs], envelope[t//ovfs]
+            pi_D, pb_D = pi[t%D], pb[t%D]
+            pbt  = -r*pi_D                       # pressure back after: -rPin(t-L/C)
+            pout = (1-r)*pi_D                    # pout
+            for j in range(4):
+                if   j==0:
+                    for m in range(6): vk[m] = v[m]
+                elif j==3:
+                    for m in range(6): vk[m] = v[m] + dt*k[2,m]
+                else:
+                    for m in range(6): vk[m] = v[m] + dt/2.0*k[j-1,m]
+                x, y, i1, i2, i3 = vk[0], vk[1], vk[3], vk[4], vk[5]
+                dpout   = (pbt-0.)/dt if j==0 else (pbt-pbt)/dt
+                k[j,0] = f1_jit(x, y, a, b, gamma)
+                k[j,1] = f2_jit(x, y, a, b, gamma)
+                k[j,2] = dpout
+                k[j,3] = i2
+                k[j,4] = A41*i1 + A42*i2 + A43*i3 + (1/MG)*dpout + A44*pout
+                k[j,5] = A51*i2 - A52*i3 + A53*pout
+            pi[t%D] = (.5*e)*k[3,1] + pb_D
+            pb[t%D] = pbt
+            for m in range(6):
+                v[m] = v[m] + dt*(2.0*(k[1,m]+k[2,m])+k[0,m]+k[3,m])/6.0
+            if mode==1:
+                for m in range(vars.size): Vs[t+1,m] = v[vars[m]]
+            elif mode==2:
+                for m in range(vars.size): Vs[t//ovfs,m] = v[vars[m]]
+            out[t//ovfs] = RB*v[5]               # output signal (synthetic)
+        return out
+
+    _KERNELS[key] = kernel
+    return kernel
+
+def _AmphibiousKernel(f1, f2):
+    key = ("amphibious", _Source(f1), _Source(f2))
+    if key in _KERNELS: return _KERNELS[key]
+
+    f1_jit, f2_jit = numba.njit(f1), numba.njit(f2)
+
+    @numba.njit(cache=False)
+    def kernel(alpha, beta, gamma, envelope, ovfs, dt, c, L, r, mode, vars, Vs):
+        samples = alpha.size
+        tmax    = samples*ovfs-1
+        D       = int(L/c/dt)
+        pi, pb  = np.zeros(D), np.zeros(D)
+        out     = np.zeros(samples)
+        v       = 1e-4*np.array([1e2, 1e1, 1.])
+        if mode==1:
+            for m in range(vars.size): Vs[0,m] = v[vars[m]]
+        k  = np.empty((4, 3))
+        vk = np.empty(3)
+        for t in range(tmax):
+            a, b, e = alpha[t//ovfs], beta[t//ovfs], envelope[t//ovfs]
+            pi_D, pb_D = pi[t%D], pb[t%D]
+            pbt  = -r*pi_D
+            for j in range(4):
+                if   j==0:
+                    for m in range(3): vk[m] = v[m]
+                elif j==3:
+                    for m in range(3): vk[m] = v[m] + dt*k[2,m]
+                else:
+                    for m in range(3): vk[m] = v[m] + dt/2.0*k[j-1,m]
+                k[j,0] = f1_jit(vk[0], vk[1], a, b, gamma)
+                k[j,1] = f2_jit(vk[0], vk[1], a, b, gamma)
+                k[j,2] = (pbt-0.)/dt if j==0 else (pbt-pbt)/dt
+            pi[t%D] = (.5*e)*k[3,1] + pb_D
+            pb[t%D] = pbt
+            for m in range(3):
+                v[m] = v[m] + dt*(2.0*(k[1,m]+k[2,m])+k[0,m]+k[3,m])/6.0
+            if mode==1:
+                for m in range(vars.size): Vs[t+1,m] = v[vars[m]]
+            elif mode==2:
+                for m in range(vars.size): Vs[t//ovfs,m] = v[vars[m]]
+            out[t//ovfs] = v[2]
+        return out
+
+    _KERNELS[key] = kernel
+    return kernel
+
+#%%
+def MotorGesturesNumba(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                       record_vars=None, record_dtype=np.float64):
+    """
+    Compiled (numba) integration of the motor gestures model, same INPUT and OUTPUT as MotorGesturesPython.
+    The kernel is compiled once per (f1, f2) pair and reused.
+    """
+    kernel = _BirdKernel(f1, f2)
+    mode, vars, Vs = RecordBuffer(record, np.size(alpha), ovfs, "bird", record_vars, record_dtype)
+    out = kernel(np.ascontiguousarray(alpha, dtype=float), np.ascontiguousarray(beta, dtype=float), float(gamma),
+                 np.ascontiguousarray(envelope, dtype=float), int(ovfs), 1./(ovfs*fs),
+                 *[float(BirdData[k]) for k in ("C", "L", "r", "Ch", "MG", "MB", "RB", "Rh")],
+                 mode, vars, Vs if Vs is not None else np.empty((0, vars.size), dtype=record_dtype))
+    return out, Vs
+
+def AmphibiousNumba(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                    record_vars=None, record_dtype=np.float64):
+    """
+    Compiled (numba) integration of the amphibious model, same INPUT and OUTPUT as AmphibiousPython.
+    """
+    kernel = _AmphibiousKernel(f1, f2)
+    mode, vars, Vs = RecordBuffer(record, np.size(alpha), ovfs, "amphibious", record_vars, record_dtype)
+    out = kernel(np.ascontiguousarray(alpha, dtype=float), np.ascontiguousarray(beta, dtype=float), float(gamma),
+                 np.ascontiguousarray(envelope, dtype=float), int(ovfs), 1./(ovfs*fs),
+                 *[float(BirdData[k]) for k in ("C", "L", "r")],
+                 mode, vars, Vs if Vs is not None else np.empty((0, vars.size), dtype=record_dtype))
+    return out, Vs
+
+#%%
+# ------------------------- batched engines ---------------------------
+def MotorGesturesBatchPython(f1, f2, alphas, betas, gammas, envelope, fs, BirdData, ovfs=20):
+    """
+    Integrate N parameter sets of the motor gestures model at once, the state is a (N x 6) array
+    and each rk4 step is done with array operations over the N candidates. The trachea delay line
+    is a ring buffer with the L/c/dt past values, so memory does not grow with N*samples*ovfs.
+    INPUT:
+        alphas, betas = (N x samples) arrays, one row per candidate
+        gammas        = N time scale constants (or one for all)
+        the rest as MotorGesturesPython
+    OUTPUT:
+        outs = (N x samples) synthetic signals
+    """
+    alphas, betas = np.atleast_2d(alphas), np.atleast_2d(betas)
+    N, samples    = alphas.shape
+    gammas        = np.broadcast_to(np.asarray(gammas, dtype=float), (N,))
+    tmax, dt      = samples*ovfs-1, 1./(ovfs*fs)
+    c, L, r, Ch = BirdData['C'], BirdData['L'], BirdData['r'], BirdData['Ch']
+    MG, MB, RB, Rh  = BirdData['MG'], BirdData['MB'], BirdData['RB'], BirdData['Rh']
+    D = int(L/c/dt)                                     # trachea delay in steps
+    pi, pb = np.zeros((D, N)), np.zeros((D, N))         # ring buffers, row t%D holds t-D
+    outs   = np.zeros((N, samples))
+    V      = np.tile(1e-4*np.array([1e2, 1e1, 1, 1, 1, 1]), (N, 1))
+
+    def ODEs(V, first):
+        dV = np.empty_like(V)
+        x, y, i1, i2, i3 = V[:,0], V[:,1], V[:,3], V[:,4], V[:,5]
+        dV[:,0] = f1(x, y, a, b, gammas)
+        dV[:,1] = f2(x, y, a, b, gammas)
+        dV[:,2] = (pbt-0.)/dt if first else (pbt-pbt)/dt      # dpout
+        dV[:,3] = i2
+        dV[:,4] = -(1/Ch/MG)*i1 - Rh*(1/MB+1/MG)*i2 +(1/MG/Ch+Rh*RB/MG/MB)*i3 \
+                  +(1/MG)*dV[:,2] + (Rh*RB/MG/MB)*pout
+        dV[:,5] = -(MG/MB)*i2 - (Rh/MB)*i3 + (1/MB)*pout
+        return dV
+
+    for t in range(tmax):
+        a, b, e = alphas[:,t//ovfs], betas[:,t//ovfs], envelope[t//ovfs]
+        pi_D, pb_D = pi[t%D], pb[t%D]
+        pbt  = -r*pi_D                                  # pressure back after: -rPin(t-L/C)
+        pout = (1-r)*pi_D                               # pout
+        k1 = ODEs(V, True)
+        k2 = ODEs(V + dt/2.0*k1, False)
+        k3 = ODEs(V + dt/2.0*k2, False)
+        k4 = ODEs(V + dt*k3, False)
+        pi[t%D] = (.5*e)*k4[:,1] + pb_D
+        pb[t%D] = pbt
+        V = V + dt*(2.0*(k2+k3)+k1+k4)/6.0
+        outs[:,t//ovfs] = RB*V[:,5]                     # output signal (synthetic)
+
+    return outs
+
+def MotorGesturesBatchNumba(f1, f2, alphas, betas, gammas, envelope, fs, BirdData, ovfs=20, workers=None):
+    """
+    Compiled batched integration, same INPUT and OUTPUT as MotorGesturesBatchPython.
+    The candidates are integrated in workers threads (all the cpus by default) with the compiled
+    kernel of MotorGesturesNumba, which releases the GIL. Python threads and not a numba parallel
+    kernel: the threads are joined before returning, so the process can still fork its worker
+    pools (Optimizer.Map, GridMap) whatever numba threading layer is installed.
+    """
+    kernel = _BirdKernel(f1, f2)
+    alphas, betas = np.atleast_2d(alphas), np.atleast_2d(betas)
+    alphas, betas = np.ascontiguousarray(alphas, dtype=float), np.ascontiguousarray(betas, dtype=float)
+    gammas   = np.broadcast_to(np.asarray(gammas, dtype=float), (alphas.shape[0],))
+    envelope = np.ascontiguousarray(envelope, dtype=float)
+    constants = [float(BirdData[k]) for k in ("C", "L", "r", "Ch", "MG", "MB", "RB", "Rh")]
+    vars, Vs  = np.zeros(0, dtype=np.int64), np.empty((0, 0))
+    outs = np.zeros(alphas.shape)
+    def Integrate(n):
+        outs[n] = kernel(alphas[n], betas[n], float(gammas[n]), envelope, int(ovfs), 1./(ovfs*fs), *constants, 0, vars, Vs)
+    with ThreadPoolExecutor(max_workers=max(1, min(alphas.shape[0], workers or os.cpu_count() or 1))) as pool:
+        list(pool.map(Integrate, range(alphas.shape[0])))
+    return outs
+
+#%%
+# ---------------------- split (labia + filters) engine -----------------
+# Only the labia (x, y) are nonlinear. The trachea is a comb filter driven by
+# (.5*envelope)*y' and the OEC (i1, i2, i3) is a linear system driven by pout and
+# dpout, both taken from the delayed pin, pi[t-D]. So the split engine integrates
+# the 2D labial oscillator with rk4 and then applies the trachea and the OEC with
+# lfilter. The OEC filter is the exact rk4 discretization of the linear ODEs (with
+# dpout only in k1 as the other engines), so the output matches
+# MotorGesturesPython/Numba up to rounding (relative error ~1e-12, < 1e-10).
+# The steps are processed by chunks of CHUNK steps carrying the labia, trachea and OEC
+# states, only the states that are read (out and the recording) are kept.
+CHUNK = 2**16   # rk4 steps per chunk, rounded to the 2D blocks of the trachea
+
+def _Labia(f1, f2):
+    # rk4 of the labia over the steps t0..t1-1 from the state (x, y), returns the states X after 
+    # each step (only if keep), y' of the last rk4 evaluation of each step (dy), which drives pin,
+    # and the last state. Plain python, numba compiles it as it is
+    def labia(alpha, beta, gamma, ovfs, dt, keep, t0, t1, x, y):
+        X  = np.empty((t1-t0 if keep else 0, 2))
+        dy = np.empty(t1-t0)
+        for t in range(t0, t1):
+            a, b = alpha[t//ovfs], beta[t//ovfs]
+            k1x, k1y = f1(x, y, a, b, gamma), f2(x, y, a, b, gamma)
+            x2,  y2  = x + dt/2.0*k1x, y + dt/2.0*k1y
+            k2x, k2y = f1(x2, y2, a, b, gamma), f2(x2, y2, a, b, gamma)
+            x3,  y3  = x + dt/2.0*k2x, y + dt/2.0*k2y
+            k3x, k3y = f1(x3, y3, a, b, gamma), f2(x3, y3, a, b, gamma)
+            x4,  y4  = x + dt*k3x, y + dt*k3y
+            k4x, k4y = f1(x4, y4, a, b, gamma), f2(x4, y4, a, b, gamma)
+            x, y  = x + dt*(2.0*(k2x+k3x)+k1x+k4x)/6.0, y + dt*(2.0*(k2y+k3y)+k1y+k4y)/6.0
+            dy[t-t0] = k4y
+            if keep: X[t-t0,0], X[t-t0,1] = x, y
+        return X, dy, x, y
+    return labia
+
+def _LabiaKernel(f1, f2):
+    key = ("labia", _Source(f1), _Source(f2))
+    if key not in _KERNELS: _KERNELS[key] = numba.njit(cache=False)(_Labia(numba.njit(f1), numba.njit(f2)))
+    return _KERNELS[key]
+
+def Trachea(dy, envelope, ovfs, D, r, t0=0, pi=None):
+    """
+    Trachea as a comb filter, pi[t] = (.5*envelope)*y'[t] - r*pi[t-2D], over the steps t0, t0+1, ...
+    INPUT:
+        dy       = labial velocity y' of each rk4 step, a multiple of 2D steps but in the last chunk
+        envelope = envelope at fs, ovfs rk4 steps per value
+        D        = trachea delay in rk4 steps, int(L/c/dt)
+        r        = reflection coefficient
+        t0       = first step of dy
+        pi       = pin of the 2D steps before t0, None for zeros (t0=0)
+    OUTPUT:
+        pi_D = pin delayed D steps, pi[t-D] (zero for t<D), it drives pout = (1-r)*pi_D and pb = -r*pi_D
+        pi   = pin of the last 2D steps, the pi of the next chunk
+    """
+    if pi is None: pi = np.zeros(2*D)
+    u      = (.5*envelope[np.arange(t0, t0+dy.size)//ovfs])*dy
+    # the comb is a first order recursion between blocks of 2D steps
+    blocks = -(-u.size//(2*D))
+    U      = np.zeros(blocks*2*D);  U[:u.size] = u
+    P      = lfilter([1.], [1., r], U.reshape(blocks, 2*D), axis=0, zi=-r*pi[np.newaxis])[0].ravel()
+    pi_D   = np.concatenate((pi[D:], P))[:u.size]
+    return pi_D, P[-2*D:]
+
+def OEC(dt, r, Ch, MG, MB, RB, Rh):
+    """
+    Beak, glottis and OEC (i1, i2, i3) as an IIR filter of the delayed pin. The filter is the rk4
+    step of the linear ODEs, i[t+1] = M i[t] + G pi_D[t], applied mode by mode (eigenvectors of M),
+    see Modes.
+    INPUT:
+        dt   = rk4 time step
+        the rest, the BirdData constants
+    OUTPUT:
+        lam = eigenvalues of M, the poles of the modes
+        V   = eigenvectors of M, i = (V z).real for the modes z
+        g   = input gain of each mode, z[t+1] = lam z[t] + g pi_D[t]
+    """
+    A  = np.array([[0,           1,                0                     ],
+                   [-(1/Ch/MG),  -Rh*(1/MB+1/MG),  (1/MG/Ch+Rh*RB/MG/MB) ],
+                   [0,           -(MG/MB),         -(Rh/MB)              ]])
+    B1 = np.array([0, 1/MG, 0])                    # dpout input, only in k1
+    B0 = np.array([0, Rh*RB/MG/MB, 1/MB])          # pout input, in every k
+    hA, Id = dt*A, np.eye(3)
+    hA2, hA3 = hA@hA, hA@hA@hA
+    M  = Id + hA + hA2/2 + hA3/6 + hA3@hA/24
+    G1 = dt/6*(Id + hA + hA2/2 + hA3/4)@B1
+    G0 = dt*(Id + hA/2 + hA2/6 + hA3/24)@B0
+    G  = G1*(-r/dt) + G0*(1-r)                      # dpout = pb/dt = -r*pi_D/dt, pout = (1-r)*pi_D
+    
+    lam, V = np.linalg.eig(M)
+    return lam, V, np.linalg.solve(V, G)
+
+def Modes(pi_D, lam, g, z):
+    # modes of the OEC after each step of pi_D (3 x steps) from the modes z before the first one
+    Z = np.empty((3, pi_D.size), dtype=complex)
+    for k in range(3): Z[k] = lfilter([1.], [1., -lam[k]], g[k]*pi_D, zi=[lam[k]*z[k]])[0]
+    return Z
+
+def _Split(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs, record, record_vars, record_dtype, model):
+    samples = int(np.size(alpha))
+    tmax, dt = samples*ovfs-1, 1./(ovfs*fs)
+    c, L, r  = BirdData['C'], BirdData['L'], BirdData['r']
+    D        = int(L/c/dt)
+    mode, vars, Vs = RecordBuffer(record, samples, ovfs, model, record_vars, record_dtype)
+    keep     = mode!=RECORD_OFF and bool(np.any(vars<2))
+    labia    = _LabiaKernel(f1, f2) if numba is not None else _Labia(f1, f2)
+    alpha, beta = np.ascontiguousarray(alpha, dtype=float), np.ascontiguousarray(beta, dtype=float)
+    envelope = np.asarray(envelope, dtype=float)
+    # rk4 state after the last step of each audio sample (the last sample has one step less)
+    index    = np.minimum((np.arange(samples)+1)*ovfs, tmax)
+    
+    x, y, pout, pi, i0 = 1e-4*1e2, 1e-4*1e1, 1e-4, None, 1e-4*np.ones(3)
+    if model=="bird":
+        lam, V, g = OEC(dt, r, *[BirdData[k] for k in ("Ch", "MG", "MB", "RB", "Rh")])
+        z = np.linalg.solve(V, i0)
+    out = np.full(samples, BirdData['RB']*i0[2] if model=="bird" else pout)  # samples with no step, tmax=0
+    if mode==RECORD_FULL: Vs[0] = np.array([x, y, pout, *i0])[vars]
+    
+    chunk = max(1, CHUNK//(2*D))*2*D
+    for t0 in range(0, tmax, chunk):
+        t1 = min(t0+chunk, tmax)
+        X, dy, x, y = labia(alpha, beta, float(gamma), int(ovfs), dt, keep, t0, t1, x, y)
+        pi_D, pi    = Trachea(dy, envelope, ovfs, D, r, t0, pi)
+        # audio samples whose state is in the chunk, and the steps of the chunk to keep
+        n0, n1 = np.searchsorted(index, [t0, t1], side="right")
+        audio  = index[n0:n1]-t0-1
+        steps  = np.arange(t1-t0) if mode==RECORD_FULL else audio
+        sel    = audio if mode==RECORD_FULL else slice(None)
+        
+        states = {}
+        if keep: states[0], states[1] = X[steps,0], X[steps,1]
+        if model=="amphibious" or 2 in vars:   # pout, only k1 has dpout = pb/dt
+            P    = pout + np.cumsum(dt*((-r*pi_D)/dt)/6.0)
+            pout = P[-1]
+            states[2] = P[steps]
+        if model=="bird":
+            Z = Modes(pi_D, lam, g, z)
+            z = Z[:,-1]
+            states[3], states[4], states[5] = (V@Z[:,steps]).real
+            out[n0:n1] = BirdData['RB']*states[5][sel]
+        else: out[n0:n1] = states[2][sel]
+        
+        if   mode==RECORD_FULL:  Vs[t0+1:t1+1] = np.array([states[v] for v in vars]).T
+        elif mode==RECORD_AUDIO: Vs[n0:n1]     = np.array([states[v] for v in vars]).T
+    return out, Vs
+
+def MotorGesturesSplit(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                       record_vars=None, record_dtype=np.float64):
+    """
+    Split integration of the motor gestures model: rk4 of the labia only (compiled when numba
+    is installed), then the trachea and the OEC as filters, by chunks of CHUNK rk4 steps.
+    Same INPUT and OUTPUT as MotorGesturesPython, out matches it with relative error < 1e-10.
+    """
+    return _Split(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs, record, record_vars, record_dtype, "bird")
+
+def AmphibiousSplit(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs=20, record="full",
+                    record_vars=None, record_dtype=np.float64):
+    """
+    Split integration of the amphibious model, same INPUT and OUTPUT as AmphibiousPython.
+    """
+    return _Split(f1, f2, alpha, beta, gamma, envelope, fs, BirdData, ovfs, record, record_vars, record_dtype, "amphibious")
+
+#%%
+# ---------------------- engines registry -------------------------------
+# engine name -> {model name -> integrator}, new engines are added with RegisterEngine
+# the "-batch" models integrate N candidates at once and only return the (N x samples) signals
+ENGINES = {"python": {"bird": MotorGesturesPython, "amphibious": AmphibiousPython,
+                      "bird-batch": MotorGesturesBatchPython}}
+if numba is not None:
+    ENGINES["numba"] = {"bird": MotorGesturesNumba, "amphibious": AmphibiousNumba,
+                        "bird-batch": MotorGesturesBatchNumba}
+# linear stage (trachea and OEC) as filters, see MotorGesturesSplit
+ENGINES["split"] = {"bird": MotorGesturesSplit, "amphibious": AmphibiousSplit}
+
+def RegisterEngine(name, model, integrator):
+    """
+    Add (or replace) an integration engine
+    INPUT:
+        name       = engine name, used as engine= in MotorGestures
+        model      = "bird" (labia, trachea and OEC), "amphibious" (labia and trachea) or "bird-batch"
+        integrator = function with the MotorGesturesPython signature returning (out, Vs),
+                     or with the MotorGesturesBatchPython signature for "bird-batch"
+    """
+    ENGINES.setdefault(name, {})[model] = integrator
+
+_AUTO_WARNED = False   # the python fallback of "auto" is warned once per process
+
+def GetEngine(engine="auto", model="bird"):
+    """
+    Return the integrator of an engine. "auto" is the compiled engine if numba is installed,
+    otherwise the python one (warned once, it is much slower).
+    """
+    global _AUTO_WARNED
+    if engine=="auto":
+        engine = "numba" if "numba" in ENGINES else "python"
+        if engine=="python" and not _AUTO_WARNED:
+            warnings.warn("numba is not installed, engine='auto' uses the (much slower) python engine: pip install numba",
+                          RuntimeWarning, stacklevel=2)
+            _AUTO_WARNED = True
+    if engine=="numba" and numba is None:
+        raise ImportError("The numba engine needs numba installed: pip install numba")
+    if engine not in ENGINES or model not in ENGINES[engine]:
+        raise ValueError("Unknown engine '{}' for the {} model. Available engines: {}".format(engine, model, list(ENGINES.keys())))
+    return ENGINES[engine][model]
@@ -1,22 +1,139 @@
 from .syllable import *
 from .birdsong import *
 from .util import *
+import multiprocessing, copy
 
 class Optimizer(Syllable, object):
-    def __init__(self, obj, method_kwargs):
+    def __init__(self, obj, method_kwargs, record="off", workers=1, levels=1, shrink=0.5, Nz=5,
+                 prune=True, silent_residual=1e6, topk=None, screen_NN=None, screen_ovfs=10,
+                 warm_start=None, narrow=False, beta_map=None):
         self.obj    = obj
         self.obj0   = obj
         self.method = method_kwargs["method"]
-        self.kwargs = {key:value for key, value in method_kwargs.items() if key!="method"}#method_kwargs
+        self.kwargs = {key:value for key, value in method_kwargs.items() if key not in _OPTIMIZER_KWARGS}#method_kwargs
         self.syllables = []
-        
+        self.record = record  # trajectory recording of the solves, off: no Vs is stored
+        # processes evaluating the brute grid points, None uses all the cores (method_kwargs["workers"] also works)
+        self.workers = method_kwargs.get("workers", workers)
+        # coarse-to-fine brute search (levels > 1): grids of Nz points per parameter, each level
+        # over a window shrink times the previous one around the best point (see ZoomMinimize)
+        self.levels  = method_kwargs.get("levels", levels)
+        self.shrink  = method_kwargs.get("shrink", shrink)
+        self.Nz      = method_kwargs.get("Nz", Nz)
+        if not 0<self.shrink<1: raise ValueError("shrink must be in (0, 1), not {}".format(self.shrink))
+        # candidates whose alpha, beta never oscillate (Syllable.Silent) are not solved, their
+        # residual is silent_residual. The count is shared with the forked brute grid processes
+        self.prune   = method_kwargs.get("prune", prune)
+        self.silent_residual = method_kwargs.get("silent_residual", silent_residual)
+        self._skipped = multiprocessing.Value("l", 0)
+        # multi-fidelity brute grids (topk set): the grid is scored on a copy of the syllable with
+        # screen_ovfs oversampling and screen_NN FFT points (NN//2 by default, see Syllable.Fidelity),
+        # then the topk best points are solved again at full fidelity (see Brute)
+        self.topk        = method_kwargs.get("topk", topk)
+        self.screen_NN   = method_kwargs.get("screen_NN", screen_NN)
+        self.screen_ovfs = method_kwargs.get("screen_ovfs", screen_ovfs)
+        self.rank_agreement = []   # Spearman correlation of both fidelities over the topk points of each grid
+        self._screen = (None, None)
+        # FitDatabase of previous fits (or an InferenceModel): OptimalGamma and OptimalParams start from
+        # (narrow=True also bound) the nearest fits (the prediction) instead of the Syllable defaults
+        self.warm_start = method_kwargs.get("warm_start", warm_start)
+        self.narrow     = method_kwargs.get("narrow", narrow)
+        # b0, b1, b2 from the FF through the oscillator frequency map (Syllable.BsFromFF) in OptimalBs:
+        # None (not used), "seed" (start values, bounds around them with narrow) or "final" (no search)
+        self.beta_map   = method_kwargs.get("beta_map", beta_map)
+    
+    @property
+    def skipped(self): return self._skipped.value    # evaluations skipped by the pruning
+    
+    def Skip(self, p):
+        # True (and counted) if the candidate p is silent and pruning is on
+        if not self.prune or not self.obj.Silent(p): return False
+        Event("silent skipped")
+        with self._skipped.get_lock(): self._skipped.value += 1
+        return True
+        
+    @Timed()
+    def Minimize(self, residual):
+        # lmfit.minimize of residual over self.obj.p, the brute grid is evaluated by self.workers processes
+        kwargs = dict(self.kwargs)
+        if self.method=="brute" and self.workers!=1: kwargs["workers"] = GridMap(self.workers)
+        if self.method=="brute" and self.levels>1:   return self.ZoomMinimize(residual, kwargs)
+        if self.method=="brute":                     return self.Brute(residual, self.obj.p, kwargs)
+        return lmfit.minimize(residual, self.obj.p, nan_policy='omit', method=self.method, **kwargs)
+    
+    def ZoomMinimize(self, residual, kwargs):
+        # coarse-to-fine brute search: a grid of Nz points per varying parameter over its bounds,
+        # then levels-1 grids over windows shrink times smaller centered (clipped to the bounds)
+        # at the best point found. Two parameters with Nz=5, levels=4 take 100 Solve calls
+        # (441 for Ns=21) and end with a finer step, (max-min)*shrink**3/4.
+        params = copy.deepcopy(self.obj.p)
+        names  = [name for name, par in params.items() if par.vary]
+        bounds = {name:(params[name].min, params[name].max) for name in names}
+        kwargs["Ns"] = self.Nz
+        for name in names: params[name].brute_step = None   # the window sets the step
+        nfev = 0
+        for level in range(self.levels):
+            mi    = self.Brute(residual, params, kwargs)
+            nfev += mi.nfev
+            for name in names:
+                low, high = bounds[name]
+                width  = (high-low)*self.shrink**(level+1)
+                center = mi.params[name].value
+                start  = min(max(center-width/2, low), high-width)
+                params[name].set(value=center, max=start+width, min=start)
+        for name in names:   # the result keeps the original bounds
+            mi.params[name].set(max=bounds[name][1], min=bounds[name][0])
+            mi.params[name].brute_step = self.obj.p[name].brute_step
+        mi.nfev = nfev
+        return mi
+    
+    def Screen(self):
+        # low fidelity copy of self.obj, made once per syllable
+        if self._screen[0] is not self.obj:
+            NN = self.screen_NN if self.screen_NN is not None else self.obj.NN//2
+            self._screen = (self.obj, self.obj.Fidelity(NN=NN, ovfs=self.screen_ovfs))
+        return self._screen[1]
+    
+    def Brute(self, residual, params, kwargs):
+        # brute grid of residual over params. With topk, the grid is evaluated at low fidelity and
+        # the best of its topk points at full fidelity is the result
+        grid = kwargs.get("workers")
+        if isinstance(grid, GridMap): grid.nfev = 0
+        if not self.topk:
+            mi = lmfit.minimize(residual, params, nan_policy='omit', method="brute", **kwargs)
+            if isinstance(grid, GridMap): mi.nfev = grid.nfev   # with the evaluations of the workers
+            return mi
+        obj, self.obj = self.obj, self.Screen()
+        try:
+            mi = lmfit.minimize(residual, params, nan_policy='omit', method="brute",
+                                **dict(kwargs, keep=max(self.topk, kwargs.get("keep", 50))))
+        finally:
+            self.obj = obj
+        if isinstance(grid, GridMap): mi.nfev = grid.nfev
+        candidates = mi.candidates[:self.topk]
+        for candidate in candidates:    # 1D grids keep the values as (1,) arrays
+            for par in candidate.params.values(): par.value = float(np.squeeze(par.value))
+        low  = np.array([candidate.score for candidate in candidates], dtype=float)
+        full = np.array([residual(candidate.params) for candidate in candidates], dtype=float)
+        full[np.isnan(full)] = np.inf
+        if low.size>1: self.rank_agreement.append(stats.spearmanr(low, full)[0])
+        best = candidates[int(np.argmin(full))]
+        mi.params, mi.brute_fval = best.params, full.min()
+        mi.brute_x0 = np.array([best.params[name].value for name in mi.var_names])
+        mi.nfev += len(candidates)
+        return mi
+        
+    @Timed()
     def residualSCI(self, p):
-        syllable_synth = self.obj.Solve(p)
+        if self.Skip(p): return self.silent_residual
+        syllable_synth = self.obj.Solve(p, record=self.record, scores=["SCIFF"])
         return syllable_synth.SCIFF #scoreSCI +  syllable_synth.scoreFF
     # return scoreSxx + syllable_synth.scoreMfccs + syllable_synth.scoreMel # scoreCorrelation #scoreSCI 
     
+    @Timed()
     def residualFF(self, p):
-        syllable_synth = self.obj.Solve(p)
+        if self.Skip(p): return self.silent_residual
+        syllable_synth = self.obj.Solve(p, record=self.record, scores=["scoreFF"])
         return syllable_synth.scoreFF # + syllable_synth.scoreCentroid
     
     # def residualIndexes(self, p):
@@ -24,13 +141,17 @@ class Optimizer(Syllable, object):
     #     #self.entropies = [EAS, ECU, ECV, EPS, EPS_KURT, EPS_SKEW]
     #     return syllable_synth.scoreACI_sum + syllable_synth.scoreBI + syllable_synth.entropies
     
+    @Timed()
     def residualCorrelation(self, p):
-        syllable_synth = self.obj.Solve(p)
+        if self.Skip(p): return self.silent_residual
+        syllable_synth = self.obj.Solve(p, record=self.record, scores=["residualCorrelation"])
         return syllable_synth.residualCorrelation
         # return syllable_synth.scoreFF -np.mean(syllable_synth.correlation+syllable_synth.Df+syllable_synth.scoreSKL)
     
-    def residualFF_shift(self, p): 
-        syllable_synth = self.obj.Solve(p)
+    @Timed()
+    def residualFF_shift(self, p):  # only needs synth.FF, no score
+        if self.Skip(p): return self.silent_residual
+        syllable_synth = self.obj.Solve(p, record=self.record, scores=[])
         delta = Norm(syllable_synth.FF - self.obj.FF - p["f0"],
                      ord=self.obj.ord)/syllable_synth.FF.size
         return delta
@@ -44,12 +165,14 @@ class Optimizer(Syllable, object):
     
     # -----------------------------------------------------------------------
     # ---------------- OPTIMAL PARAMETERS ------------------------------
+    @Timed()
     def OptimalBs(self, obj):
         self.obj = obj
+        if self.beta_map is not None and self.SeedBs(): return
         # ---------------- b0 and b2 --------------------
         start02 = time.time()
         self.obj.p["b0"].set(vary=True);  obj.p["b2"].set(vary=True);
-        mi02    = lmfit.minimize(self.residualFF, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi02    = self.Minimize(self.residualFF)
         self.obj.p["b0"].set(vary=False, value=mi02.params["b0"].value)
         self.obj.p["b2"].set(vary=False, value=mi02.params["b2"].value)
         end02   = time.time()
@@ -57,7 +180,7 @@ class Optimizer(Syllable, object):
         # ---------------- b1--------------------
         start1 = time.time()
         self.obj.p["b1"].set(vary=True)
-        mi1    = lmfit.minimize(self.residualFF, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi1    = self.Minimize(self.residualFF)
         self.obj.p["b1"].set(vary=False, value=mi1.params["b1"].value)
         end1   = time.time()
         print(r"$b_1*$"+"={0:.4f}, t={1:.4f} min".format(self.obj.p["b1"].value, (end1-start1)/60))
@@ -65,19 +188,34 @@ class Optimizer(Syllable, object):
         #return self.obj.p
         obj = self.obj
 
+    def SeedBs(self, margin=0.1):
+        # b0, b1, b2 of Syllable.BsFromFF as values of self.obj.p, with narrow the bounds are the
+        # margin times the original range around them. True if they are the final values (beta_map="final")
+        start = time.time()
+        b_ff  = self.obj.BsFromFF()
+        for key, b in zip(("b0","b1","b2"), b_ff):
+            par = self.obj.p[key]
+            if self.narrow and self.beta_map=="seed":
+                pad = margin*(par.max-par.min)
+                par.set(min=float(max(b-pad, par.min)), max=float(min(b+pad, par.max)), value=b)
+            else:
+                par.set(value=b)
+        print("b* from FF={}, t={:.4f} min".format(np.round(b_ff, 4), (time.time()-start)/60))
+        return self.beta_map=="final"
+    
         # ---------------- OPTIMAL PARAMETERS chunck ------------------------------
     def OptimalBs_chunck(self, obj):
     
         start0 = time.time()
         self.obj.p["b0"].set(vary=True)
-        mi0    = lmfit.minimize(self.residualFF, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi0    = self.Minimize(self.residualFF)
         self.obj.p["b0"].set(vary=False, value=mi0.params["b0"].value)
         end0   = time.time()
         print(r"$b_0*$"+"={0:.4f}, t={1:.4f} min".format(self.obj.p["b0"].value, (end0-start0)/60))
     # ---------------- b1--------------------
         start1 = time.time()
         self.obj.p["b1"].set(vary=True)
-        mi1    = lmfit.minimize(self.residualFF, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi1    = self.Minimize(self.residualFF)
         self.obj.p["b1"].set(vary=False, value=mi1.params["b1"].value)
         end1   = time.time()
         print(r"$b_1*$"+"={0:.4f}, t={1:.4f} min".format(self.obj.p["b1"].value, (end1-start1)/60))
@@ -85,6 +223,7 @@ class Optimizer(Syllable, object):
         #return self.obj.p
         obj = self.obj
         
+    @Timed()
     def OptimalAs(self, obj):
         self.obj = obj
         
@@ -97,7 +236,7 @@ class Optimizer(Syllable, object):
         # ---------------- a0--------------------
         start0 = time.time()
         self.obj.p["a0"].set(vary=True)
-        mi0    = lmfit.minimize(self.residualCorrelation, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi0    = self.Minimize(self.residualCorrelation)
         self.obj.p["a0"].set(vary=False, value=mi0.params["a0"].value)
         end0   = time.time()
         print(r"$a_0*$"+"={0:.4f}, t={1:.4f} min".format(self.obj.p["a0"].value, (end0-start0)/60))
@@ -113,11 +252,13 @@ class Optimizer(Syllable, object):
         # #return self.obj.p["b0"].value, self.obj.p["b1"].value #end0-start0, end1-start1
         obj = self.obj
     
+    @Timed()
     def OptimalGamma(self, obj):
         self.obj = obj
+        if self.warm_start is not None: self.warm_start.Apply(obj, bounds=self.narrow, coefs=["gm"])
         start = time.time()
         self.obj.p["gm"].set(vary=True)
-        mi    = lmfit.minimize(self.residualSCI, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi    = self.Minimize(self.residualSCI)
         self.obj.p["gm"].set(value=mi.params["gm"].value, vary=False)
         end   = time.time()
         print("γ* =  {0:.0f}, t={1:.4f} min".format(self.obj.p["gm"].value, (end-start)/60))
@@ -125,12 +266,13 @@ class Optimizer(Syllable, object):
         obj = self.obj
         return mi.params["gm"].value
     
+    @Timed()
     def OptimalF0(self, obj, Ns=21):
         self.obj = obj; self.kwargs["Ns"] = Ns;
         # ---------------- f0, FF shift --------------------
         start02 = time.time()
         self.obj.p["f0"].set(vary=True);
-        mi02    = lmfit.minimize(self.residualFF_shift, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi02    = self.Minimize(self.residualFF_shift)
         self.obj.p["f0"].set(vary=False, value=mi02.params["f0"].value)
         end02   = time.time()
         print(r"$f_0*$"+"={:.4f},\nt={:.4f} min".format(self.obj.p["f0"].value, (end02-start02)/60))
@@ -169,7 +311,7 @@ class Optimizer(Syllable, object):
                             ('b1',   1,  True,  0.2,     2,  None, None),#0.04), 
                             ('b2',   0., True,    0,    2,  None, None), 
                             ('gm',   gm, True,  1e4,  1e5,  None, 2000))
-        mi    = lmfit.minimize(self.residualFFandSCI, self.obj.p, nan_policy='omit', method=self.method, **self.kwargs) 
+        mi    = self.Minimize(self.residualFFandSCI)
         self.obj.p["a0"].set(vary=False, value=mi.params["a0"].value)
         self.obj.p["a1"].set(vary=False, value=mi.params["a1"].value)
         self.obj.p["a2"].set(vary=False, value=mi.params["a2"].value)
@@ -178,11 +320,12 @@ class Optimizer(Syllable, object):
         self.obj.p["b2"].set(vary=False, value=mi.params["b2"].value)
         self.obj.p["gm"].set(vary=False, value=mi.params["gm"].value)
         
-        synth = self.obj.Solve(self.obj.p)
+        synth = self.obj.Solve(self.obj.p, record=self.record)
         end = time.time()
         print("Time of execution = {0:.4f}".format(end-start))
         return synth
         
+    @Timed()
     def AllGammas(self, bird, Ns=21):
         start = time.time()
         if self.method=="brute": self.kwargs["Ns"] = Ns
@@ -200,8 +343,10 @@ class Optimizer(Syllable, object):
         print("Time of execution = {0:.4f} minutes".format((end-start)/60))
         return self.optimal_gamma
         
+    @Timed()
     def OptimalParams(self, obj, Ns=21):
         if self.method=="brute": self.kwargs["Ns"] = Ns     
+        if self.warm_start is not None: self.warm_start.Apply(obj, bounds=self.narrow)
         start = time.time()
         print("As");   self.OptimalAs(obj);   
         print("Bs");   self.OptimalBs(obj);
@@ -211,6 +356,8 @@ class Optimizer(Syllable, object):
         
         end = time.time()
         print("Time of execution = {0:.4f} minutes".format((end-start)/60))
+        if self.prune: print("Silent candidates skipped: {}".format(self.skipped))
+        if len(self.rank_agreement)!=0: print("Screening rank agreement (Spearman): {:.3f}".format(np.nanmean(self.rank_agreement)))
         #obj.p["gamma"].set(value=optimal_gm)
         #obj_synth = obj.Solve(obj.p)     #
         
@@ -226,7 +373,7 @@ class Optimizer(Syllable, object):
             obj       = bird.Syllable(i)
             print("Syllable: {}".format(i))
             self.OptimalParams(obj=obj)
-            obj_synth = obj.Solve(obj.p)            
+            obj_synth = obj.Solve(obj.p, record=self.record)            
             
             s_synth_song[indexes[i-1]] = obj_synth.s
             
@@ -239,17 +386,21 @@ class Optimizer(Syllable, object):
     
     
     
-    def AllGammasByTimes(self, times, Ns=21, NN=1024):
+    @Timed()
+    def AllGammasByTimes(self, times, Ns=21, NN=1024, workers=1):
+        # workers > 1 optimizes the syllables in a process pool, None uses all the cores
         if self.method=="brute": self.kwargs["Ns"] = Ns     
 
         times   = np.array(times)
-        Gammas = np.zeros(times.shape[0])
-        for i in range(times.shape[0]):
-            print("Syllable {}/{}".format(i+1,times.shape[0]))
-            print(times[i,:])
-            syllable = Syllable(self.obj, tlim=times[i,:], NN=NN)
-            Gammas[i-1] = self.OptimalGamma(syllable)
-            self.obj = self.obj0
+        tasks   = [(times[i,:], NN) for i in range(times.shape[0])]
+        if workers==1:
+            Gammas = np.zeros(times.shape[0])
+            for i in range(times.shape[0]):
+                print("Syllable {}/{}".format(i+1,times.shape[0]))
+                print(times[i,:])
+                Gammas[i] = self.GammaByTimes(*tasks[i])
+        else:
+            Gammas = np.array(self.Map(_GammaByTimes, tasks, workers))
             
         self.optimal_gamma = np.mean(Gammas)
         self.Gammas = Gammas
@@ -258,14 +409,74 @@ class Optimizer(Syllable, object):
         
         return self.optimal_gamma
     
-    def SongByTimes(self, times, Ngm=11, Nba=11, NN=512, optimal_gamm=-1): 
+    @Timed()
+    def GammaByTimes(self, tlim, NN=1024):
+        syllable = Syllable(self.obj, tlim=tlim, NN=NN)
+        gamma    = self.OptimalGamma(syllable)
+        self.obj = self.obj0
+        return gamma
+    
+    @Timed()
+    def SyllableByTimes(self, tlim, optimal_gamm, Ns=11, NN=512):
+        # optimal parameters of the syllable at tlim, returns its real and synthetic signals,
+        # alpha, beta and parameters (arrays, so it can run in a process pool)
+        obj       = Syllable(self.obj, tlim=tlim, umbral_FF=self.obj.umbral_FF, Nt=30, NN=NN)
+        obj.p["gm"].set(value=optimal_gamm)
+        obj_synth = obj.Solve(obj.p, record=self.record)
+        self.OptimalParams(obj, Ns=Ns)
+        obj_synth = obj.Solve(obj.p, record=self.record)
+        self.obj  = self.obj0
+        return obj.s, obj_synth.s, obj_synth.alpha, obj_synth.beta, obj.p
+    
+    def Map(self, function, tasks, workers=None, done=None):
+        # run function(task) for each task in a process pool, results are in the tasks order and
+        # done(i, result) is called as soon as the task i finishes.
+        # Each process has its own copy of this optimizer (see _InitWorker)
+        method_kwargs = dict(method=self.method, levels=self.levels, shrink=self.shrink, Nz=self.Nz,
+                             prune=self.prune, silent_residual=self.silent_residual, topk=self.topk,
+                             screen_NN=self.screen_NN, screen_ovfs=self.screen_ovfs, warm_start=self.warm_start,
+                             narrow=self.narrow, beta_map=self.beta_map, **self.kwargs)     # without workers
+        results = [None]*len(tasks)
+        with Pool(processes=workers, initializer=_InitWorker, initargs=(self.obj0, method_kwargs, self.record)) as pool:
+            for i, result, skipped in pool.imap_unordered(_Counted, [(i, function, task) for i, task in enumerate(tasks)]):
+                results[i] = result
+                with self._skipped.get_lock(): self._skipped.value += skipped
+                if done is not None: done(i, result)
+        return results
+    
+    def Checkpoint(self, checkpoint, *inputs):
+        # folder of the SongByTimes checkpoints of these inputs and optimizer settings, None if
+        # checkpoint is None/False. checkpoint=True uses paths.results/checkpoints (or CACHE_DIR)
+        if checkpoint is None or checkpoint is False: return None
+        if checkpoint is not True:                       root = Path(checkpoint)
+        elif getattr(self.obj, "paths", None) is not None: root = Path(self.obj.paths.results) / "checkpoints"
+        else:                                            root = CACHE_DIR / "checkpoints"
+        kwargs = {key:value for key, value in self.kwargs.items() if key!="Ns"}   # Ns is set by Ngm and Nba
+        key    = SolveCache.Key(np.asarray(self.obj.s, dtype=float), self.obj.fs, self.method, kwargs, self.levels,
+                                self.shrink, self.Nz, self.prune, self.silent_residual, self.topk, self.screen_NN,
+                                self.screen_ovfs, self.narrow, self.beta_map, None if self.warm_start is None else self.warm_start.coefs,
+                                *[np.asarray(value, dtype=float) for value in inputs])
+        folder = root / "{}-{}".format(Path(str(self.obj.file_name)).stem, key[:16])
+        folder.mkdir(parents=True, exist_ok=True)
+        return folder
+    
+    @Timed()
+    def SongByTimes(self, times, Ngm=11, Nba=11, NN=512, optimal_gamm=-1, workers=1, checkpoint=None): 
+        # workers > 1 optimizes the syllables in a process pool, None uses all the cores.
+        # checkpoint (True or a folder) saves γ* and each syllable result as it finishes, a call
+        # with the same inputs loads them and only optimizes the missing syllables
         times   = np.array(times)
         indexes = np.int64(times*self.obj.fs)
         # times = [[t0_1, tend1],...,[t0_N, tendN]]
+        folder  = self.Checkpoint(checkpoint, times, Ngm, Nba, NN, optimal_gamm)
         print("Looking for optial time scale constant (γ*)")
         tstart = time.time()
         
-        if optimal_gamm==-1:  optimal_gamm = self.AllGammasByTimes(times, Ns=Ngm, NN=NN)
+        if optimal_gamm==-1 and folder is not None and (folder/"gamma.npz").exists():
+            optimal_gamm = float(np.load(folder/"gamma.npz")["gamma"])
+        if optimal_gamm==-1:  
+            optimal_gamm = self.AllGammasByTimes(times, Ns=Ngm, NN=NN, workers=workers)
+            if folder is not None: _SaveCheckpoint(folder/"gamma.npz", gamma=optimal_gamm)
 
         tend = time.time()
         print("γ found {} over {} syllables. Time of execution {:.4f} min".format(optimal_gamm, times.shape[0], (tend-tstart)/60))
@@ -281,28 +492,41 @@ class Optimizer(Syllable, object):
         
         start = time.time()
         print("Start syllables optimization")
-        for i in range(times.shape[0]):
-            print("Syllable {}/{}".format(i+1,times.shape[0]))
-            obj       = Syllable(self.obj, tlim=times[i,:], umbral_FF=self.obj.umbral_FF, Nt=30, NN=NN)
-            obj.p["gm"].set(value=optimal_gamm)
-            obj_synth = obj.Solve(obj.p)
-            self.OptimalParams(obj, Ns=Nba)
-            obj_synth = obj.Solve(obj.p)
-            self.syllables.append(obj_synth.s)
+        tasks   = [(times[i,:], optimal_gamm, Nba, NN) for i in range(times.shape[0])]
+        results = [None]*len(tasks)
+        if folder is not None:
+            for i in range(len(tasks)): results[i] = _LoadSyllable(folder/"syllable-{}.npz".format(i))
+            print("{} syllables restored from {}".format(sum(result is not None for result in results), folder))
+        todo = [i for i in range(len(tasks)) if results[i] is None]
+        
+        def Done(i, result):
+            results[i] = result
+            if folder is not None: _SaveSyllable(folder/"syllable-{}.npz".format(i), result)
+        
+        if workers==1: 
+            for i in todo:
+                print("Syllable {}/{}".format(i+1,times.shape[0]))
+                Done(i, self.SyllableByTimes(*tasks[i]))
+        elif len(todo)!=0:
+            if self.method=="brute": self.kwargs["Ns"] = Nba
+            self.Map(_SyllableByTimes, [tasks[i] for i in todo], workers, done=lambda j, result: Done(todo[j], result))
+        
+        # merge in the times order
+        for i, (s, synth_s, alpha, beta, p) in enumerate(results):
+            self.syllables.append(synth_s)
             
-            index_0, index_end = indexes[i,0], int(indexes[i,0]+obj_synth.s.size)
+            index_0, index_end = indexes[i,0], int(indexes[i,0]+synth_s.size)
             
-            self.bird_s[index_0: index_end]       = obj.s
-            self.synth_bird_s[index_0: index_end] = obj_synth.s
-            self.alphas[index_0: index_end]       = obj_synth.alpha
-            self.betas[index_0: index_end]        = obj_synth.beta
+            self.bird_s[index_0: index_end]       = s
+            self.synth_bird_s[index_0: index_end] = synth_s
+            self.alphas[index_0: index_end]       = alpha
+            self.betas[index_0: index_end]        = beta
             
-            self.ps.append(obj.p)
-            self.obj=self.obj0
+            self.ps.append(p)
             
         # self.synth_bird = BirdSong(self.obj.paths, self.obj.no_file, sfs=[self.synth_bird_s, self.obj.fs], split_method="amplitud", umbral=-.01)
-        self.synth_bird = Syllable(self.obj0, NN=NN, sfs=[self.synth_bird_s, obj.fs])
-        self.bird       = Syllable(self.obj0, NN=NN, sfs=[self.bird_s, obj.fs])
+        self.synth_bird = Syllable(self.obj0, NN=NN, sfs=[self.synth_bird_s, self.obj0.fs])
+        self.bird       = Syllable(self.obj0, NN=NN, sfs=[self.bird_s, self.obj0.fs])
         
         #self.synth_bird.synth    = self.synth_bird 
         # self.synth_bird.file_name = self.obj.file_name
@@ -345,4 +569,88 @@ class Optimizer(Syllable, object):
         
     #     # self.synth_bird_s = self.synth_bird_s
         
-    #     return self.synth_bird_s
\ No newline at end of file
+    #     return self.synth_bird_s
+
+#%%
+# ------------------ process pool workers of Optimizer.Map ------------------
+# each process builds its own Optimizer once, the Syllables (with the lambdified
+# f1, f2) are created inside the workers so only the birdsong is pickled
+_WORKER = {}
+
+# keys of method_kwargs that configure the Optimizer and are not passed to lmfit.minimize
+_OPTIMIZER_KWARGS = ("method", "workers", "levels", "shrink", "Nz", "prune", "silent_residual",
+                     "topk", "screen_NN", "screen_ovfs", "warm_start", "narrow", "beta_map")
+
+def _InitWorker(obj, method_kwargs, record):
+    # pool processes can not start other pools, so the brute grid is serial inside them
+    _WORKER["optimizer"] = Optimizer(obj, method_kwargs, record=record, workers=1)
+
+def _GammaByTimes(task):     return _WORKER["optimizer"].GammaByTimes(*task)
+
+def _SyllableByTimes(task):  return _WORKER["optimizer"].SyllableByTimes(*task)
+
+def _Counted(args):
+    # index and result of function(task) and the evaluations the worker skipped running it
+    i, function, task = args
+    skipped = _WORKER["optimizer"].skipped
+    return i, function(task), _WORKER["optimizer"].skipped-skipped
+
+#%%
+# ------------------ SongByTimes checkpoints ------------------
+# one .npz per file, written to a temporary file first so a crash never leaves a broken checkpoint
+def _SaveCheckpoint(file, **arrays):
+    tmp = file.with_name(file.stem+"-tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, file)
+
+def _SaveSyllable(file, result):
+    s, synth_s, alpha, beta, p = result
+    _SaveCheckpoint(file, s=s, synth_s=synth_s, alpha=alpha, beta=beta, p=p.dumps())
+
+def _LoadSyllable(file):
+    # (s, synth_s, alpha, beta, p) as returned by SyllableByTimes, None if it is not saved (or broken)
+    if not file.exists(): return None
+    try:
+        with np.load(file) as data:
+            p = lmfit.Parameters().loads(str(data["p"]))
+            return data["s"], data["synth_s"], data["alpha"], data["beta"], p
+    except (OSError, ValueError, KeyError): return None
+
+#%%
+# --------------------- parallel brute grid ---------------------------
+# lmfit passes workers to scipy.optimize.brute, which accepts a map-like callable. The
+# objective holds the Syllable (lambdified f1, f2 can not be pickled), so GridMap forks
+# processes that inherit it and only the grid points are sent. The first point is
+# evaluated here before forking, so the lazy features of the syllable are computed once
+# and shared. The values are the same as in the serial map, so is the brute result.
+# The evaluations counted by lmfit in the workers are lost, nfev sums the ones of each
+# worker (the Optimizer reports it as the nfev of the brute result).
+_GRID = {}
+
+def _GridPoints(points):
+    # values of a chunk of points and the evaluations made in this worker
+    return [_GRID["func"](x) for x in points], len(points)
+
+class GridMap(object):
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.nfev    = 0      # evaluations of the grids mapped, here and in the workers
+        
+    def __call__(self, func, iterable):
+        points = list(iterable)
+        if len(points)<2 or "fork" not in multiprocessing.get_all_start_methods():
+            self.nfev += len(points)
+            return list(map(func, points))   # serial where processes can not be forked (Windows)
+        values = [func(points[0])]
+        self.nfev += 1
+        _GRID["func"] = func
+        try:
+            workers = self.workers or os.cpu_count()
+            with multiprocessing.get_context("fork").Pool(processes=workers) as pool:
+                size   = -(-(len(points)-1)//(4*workers))   # 4 chunks per worker, as pool.map
+                chunks = [points[i:i+size] for i in range(1, len(points), size)]
+                for chunk, nfev in pool.imap(_GridPoints, chunks):
+                    values += chunk;  self.nfev += nfev
+        finally:
+            _GRID.clear()
+        return values
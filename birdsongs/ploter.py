@@ -72,30 +72,37 @@ class Ploter(object):
         else: print("This  is not a synthetic syllable, remember create a synthetic file using the funcion bs.Solve().")
     
     #%%
-    def PlotVs(self,obj, xlim=(), figsize=None, save=None):
+    def PlotVs(self,obj, xlim=(), figsize=None, save=None, record="audio"):
         if "synth" in obj.file_name.split("-"):
+            # only x, y and the output (i2, pout in the amphibious model) are plotted, record them
+            # if the trajectory was not recorded
+            out = 4 if getattr(obj, "model", "bird")=="bird" else 2
+            if getattr(obj, "Vs", None) is None or not {0,1,out} <= set(obj.Vs_vars):
+                obj.RecordVs(record=record, record_vars=[0,1,out])
+            Vs = lambda i: obj.Vs[:,obj.Vs_vars.index(i)]
+            
             plt.close()
             if len(xlim)==0: xlim=(obj.timesVs[0], obj.timesVs[-1])
             if figsize is None: figsize=(2*self.figsize[0], 2*self.figsize[1])
             fig, ax = plt.subplots(2, 2, figsize=figsize, sharex=True)
 
-            ax[0,0].plot(obj.timesVs, obj.Vs[:,1], color='g') 
+            ax[0,0].plot(obj.timesVs, Vs(1), color='g') 
             ax[0,0].set_ylabel("$p_{in}$")
             ax[0,0].set_title(r"Trachea Input Pressure ($p_{in}$)")
             ax[0,0].set_xlim(xlim); 
             
-            ax[0,1].plot(obj.timesVs, obj.Vs[:,4], color='b')
+            ax[0,1].plot(obj.timesVs, Vs(out), color='b')
             ax[0,1].set_ylabel("$p_{out}$")
             ax[0,1].set_title(r"Trachea Output Pressure ($p_{out}$)")
             ax[0,1].set_xlim(xlim); #ax[0,1].sharex(ax[0,0])
             
-            ax[1,0].plot(obj.timesVs, obj.Vs[:,0], color='r')
+            ax[1,0].plot(obj.timesVs, Vs(0), color='r')
             ax[1,0].set_xlabel("Time (s)")
             ax[1,0].set_ylabel("$x(t)$")
             ax[1,0].set_title(r"Labial Walls Displacement ($x(t)$)")
             ax[1,0].set_xlim(xlim); #ax[1,0].sharex(ax[0,1]); 
             
-            ax[1,1].plot(obj.timesVs, obj.Vs[:,0], color='m')
+            ax[1,1].plot(obj.timesVs, Vs(0), color='m')
             ax[1,1].set_xlabel("Time (s)")
             ax[1,1].set_ylabel("$y(t)$");
             ax[1,1].set_title(r"Labial Walls Velocity ($y(t)$)")
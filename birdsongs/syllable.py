@@ -1,5 +1,29 @@
 from .util import *
+from .engines import GetEngine, TimesVs, RecordBuffer, STATE_VARS, RECORD_OFF, _Source
 from pathlib import Path
+from functools import cached_property
+from scipy.optimize import lsq_linear
+import copy
+
+# score -> groups of features/deltas that SynthScores computes to get it (scores spec)
+SCORES = {"scoreFF":["FF"], "scoreSCI":["SCI"], "SCIFF":["FF","SCI","SCIFF"],
+          "scoreCorrelation":["dissimilarity"], "scoreSKL":["dissimilarity"], "scoreDF":["dissimilarity"],
+          "residualCorrelation":["FF","dissimilarity","residualCorrelation"],
+          "scoreEnv":["Env"], "scoreRMS":["RMS"], "scoreCentroid":["Centroid"], "scoreF_msf":["F_msf"],
+          "scoreSxx":["Sxx"], "scoreMel":["Mel"], "scoreMfccs":["Mfccs"]}
+# scalar scores reported by Syllable.SolveBatch for each candidate
+BATCH_SCORES = ["scoreFF", "scoreSCI", "SCIFF", "scoreCorrelation", "residualCorrelation", "scoreSKL", "scoreDF",
+                "scoreEnv", "scoreRMS", "scoreCentroid", "scoreF_msf", "scoreSxx", "scoreMel", "scoreMfccs"]
+# motor gestures parameters, order of the parameter vectors of SolveReference
+PARAMS = ["a0", "a1", "a2", "b0", "b1", "b2", "gm", "f0"]
+
+def ScoreGroups(scores=None):
+    # groups of SynthScores needed by a list of scores, None means all of them
+    if scores is None: scores = SCORES.keys()
+    elif isinstance(scores, str): scores = [scores]
+    unknown = [score for score in scores if score not in SCORES]
+    if len(unknown)!=0: raise ValueError("Unknown scores {}, available: {}".format(unknown, list(SCORES.keys())))
+    return set(group for score in scores for group in SCORES[score])
 
 class Syllable(object):
     #%%
@@ -10,29 +34,38 @@ class Syllable(object):
         fs = sampling rate
         t0 = initial time of the syllable
     """ 
-    # def __getstate__(self):
-    #     state = self.__dict__.copy()
-    #     #del state[''] # remove the unpicklable progress attribute
-    #     return state
-    # def __setstate__(self, state):
-    #     self.__dict__.update(state)
-    #     # restore the progress from the progress integer
-    #     #self.progress = make_progress(self.progress_int)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the lambdified labia ODEs can't be pickled, they are rebuilt from f1f2 (BifurcationODE cache)
+        state.pop("f1", None);  state.pop("f2", None)
+        if state.get("cache") is SOLVE_CACHE: state["cache"] = True   # the shared cache of the receiver
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if state.get("cache") is True: self.cache = SOLVE_CACHE
+        if "f1f2" in state: _, _, self.f1, self.f2 = BifurcationODE(*self.f1f2)
 
     #%%
+    @Timed()
     def __init__(self, birdsong=None, t0=0, Nt=100, llambda=1.5, NN=None, overlap=0.5, flim=(1.5e3,2e4), n_mfcc=8,
                  n_mels=4, umbral_FF=1, tlim=[], sfs=[], no_syllable=0, ide="syllable", ff_method="yin", t0_bs=None,
-                 file_name="syllable", paths=None, f1f2=None, type="", BirdData=None):
+                 file_name="syllable", paths=None, f1f2=None, type="", BirdData=None, engine="auto", record=None,
+                 cache=True):
         ## The bifurcation can be cahge modifying the self.f2 and self.f1 functions
         ## ------------- Bogdanov–Takens bifurcation ------------------
         if f1f2 is None:
             f1 = "ys"
             f2 = "(-alpha-beta*xs-xs**3+xs**2)*gamma**2 -(xs+1)*gamma*xs*ys"
-        beta_bif, mu1_curves, f1, f2 = BifurcationODE(f1, f2)
+        else: 
+            f1, f2 = f1f2
+        self.f1f2 = (f1, f2)                                    # expressions of the labia ODEs
+        beta_bif, mu1_curves, f1, f2 = BifurcationODE(f1, f2)   # cached per (f1, f2) pair
         self.beta_bif = beta_bif
         self.mu1_curves = mu1_curves
         self.f1 = f1
         self.f2 = f2
+        self.default_labia = f1f2 is None    # Oscillating knows the oscillating region of this model only
+        self.model = "bird"                  # model of the integrators (GetEngine), see Amphibious
         ## Defining motor gestures model constants, measure by Gabo Mindlin 
         self.BirdData = {"C":343, "L":0.025, "r":0.65, "Ch":1.43E-10,
                          "MG":20, "MB":1E4, "RB":5E6, "Rh":24E3}
@@ -61,6 +94,15 @@ class Syllable(object):
         self.type        = type
         self.no_syllable = no_syllable
         self.ff_method   = ff_method
+        self.engine      = engine    # integration engine of MotorGestures: "auto", "python" or "numba"
+        self.ovfs        = 20        # oversampling of the motor gestures integration in Solve
+        # trajectory (Vs) recording of MotorGestures: None (off), "full" or "audio" (decimated to fs),
+        # record_vars selects the state variables (names or indexes) and record_dtype their dtype
+        self.record       = record
+        self.record_vars  = None
+        self.record_dtype = PRECISION["float"] or np.float64
+        # integrations cache (see SolveCache): True the shared SOLVE_CACHE, False without cache
+        self.cache        = SOLVE_CACHE if cache is True else (cache if isinstance(cache, SolveCache) else None)
         
         # define a syllable by entering the amplitude array (out)
         if birdsong!=None: 
@@ -100,6 +142,7 @@ class Syllable(object):
         elif len(tlim)!=0:
             self.s  = sound.normalize(s[int(tlim[0]*self.fs):int(tlim[1]*self.fs)], max_amp=1.0)
             self.t0 = tlim[0]
+        self.s = AsPrecision(self.s)   # the spectral features follow its dtype
 
         self.time_s   = np.linspace(0, len(self.s)/self.fs, len(self.s))
         self.envelope = Enve(self.s, self.fs, self.Nt)
@@ -125,33 +168,10 @@ class Syllable(object):
         # -------------------------------------------------------------------
         # ------------- ACOUSTIC FEATURES -----------------------------------
         # -------------------------------------------------------------------
-        self.stft = librosa.stft(y=self.s, n_fft=self.NN, hop_length=self.hop_length, win_length=self.NN, window='hann',
-                                 center=self.center, dtype=None, pad_mode='constant')
-        freqs, times, mags = librosa.reassigned_spectrogram(self.s, sr=self.fs, S=self.stft, n_fft=self.NN,
-                                        hop_length=self.hop_length, win_length=self.win_length, window='hann', 
-                                        center=self.center, reassign_frequencies=True, reassign_times=True,
-                                        ref_power=1e-06, fill_nan=True, clip=True, dtype=None, pad_mode='constant')
-        
-        self.freqs   = freqs  
-        self.times   = times 
-        self.Sxx     = mags 
-        self.Sxx_dB  = librosa.amplitude_to_db(mags, ref=np.max)
-        self.FF_coef = np.abs(self.stft)
+        # The features (stft, Sxx, mfccs, FF, SCI, ...) are lazy attributes: each one is computed 
+        # the first time it is read and then cached, see the ACOUSTIC FEATURES section below.
         self.freq = librosa.fft_frequencies(sr=self.fs, n_fft=self.NN) 
-        self.time = librosa.times_like(X=self.stft,sr=self.fs, hop_length=self.hop_length, n_fft=self.NN) #, axis=-1
-        self.time -= self.time[0]
-        
-        self.f_msf   = np.array([Norm(self.FF_coef[:,i]*self.freq, 1)/Norm(self.FF_coef[:,i], 1) for i in range(self.FF_coef.shape[1])])        
-        
-        self.centroid =  feature.spectral_centroid(y=self.s, sr=self.fs, S=np.abs(self.stft), n_fft=self.NN,
-                                            hop_length=self.hop_length, freq=self.freqs, win_length=self.win_length, 
-                                            window='hann',center=self.center, pad_mode='constant')[0]
-        self.mfccs = feature.mfcc(y=self.s, sr=self.fs, S=self.stft, n_mfcc=self.n_mfcc, dct_type=2, norm='ortho', lifter=0)
-        self.rms   = feature.rms(y=self.s, S=self.stft, frame_length=self.NN, hop_length=self.hop_length,
-                                 center=self.center, pad_mode='constant')[0]
-        self.s_mel = feature.melspectrogram(y=self.fs, sr=self.fs, S=self.stft, n_fft=self.NN, hop_length=self.hop_length,
-                                            win_length=self.win_length, window='hann', center=self.center, pad_mode='constant', power=2.0)
-       
+        
         # pitches[..., f, t] contains instantaneous frequency at bin f, time t
         # magnitudes[..., f, t] contains the corresponding magnitudes.
         # Both pitches and magnitudes take value 0 at bins of non-maximal magnitude.
@@ -191,28 +211,6 @@ class Syllable(object):
         # # self.entropies = [EAS, ECU, ECV, EPS, EPS_KURT, EPS_SKEW]
         # # self.times_on = times_on
         
-        # # ------------- "better method" --------------
-        if self.ff_method=="pyin":
-            self.FF,_,_     = pyin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
-                                   win_length=self.win_length, hop_length=self.hop_length, n_thresholds=100, beta_parameters=(2, 18), 
-                                   boltzmann_parameter=2, resolution=0.1, max_transition_rate=35.92, switch_prob=0.01, 
-                                   no_trough_prob=0.01, fill_na=0, center=self.center, pad_mode='constant')
-        elif self.ff_method=="yin":
-            self.FF = yin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
-                          win_length=self.win_length, hop_length=self.hop_length, center=self.center,
-                          trough_threshold=self.umbral_FF, pad_mode='constant')
-        elif self.ff_method=="both":
-            self.FF2    = yin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
-                              win_length=self.win_length, hop_length=self.hop_length, center=self.center,
-                              trough_threshold=self.umbral_FF, pad_mode='constant')
-            self.FF,_,_ = pyin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
-                               win_length=self.win_length, hop_length=self.hop_length, n_thresholds=100, beta_parameters=(2, 18), 
-                               boltzmann_parameter=2, resolution=0.1, max_transition_rate=35.92, switch_prob=0.01, 
-                               no_trough_prob=0.01, fill_na=0, center=self.center, pad_mode='constant')
-        elif self.ff_method=="manual":
-            print("Not implemented yet.")
-            pass
-        
 #         # # remove atypical data
 #         df = pd.DataFrame(data={"FF":self.FF, "time":self.time})
 #         q  = df["FF"].quantile(0.99)
@@ -224,42 +222,246 @@ class Syllable(object):
 #         self.FF = self.FF[df_filtered["FF"].index]
 
         #self.timeFF = np.linspace(0,self.times[0][-1]+0.1,self.FF.size)
-        self.timeFF = np.linspace(0,self.time[-1],self.FF.size)
-        self.FF_fun = interp1d(self.timeFF, self.FF)
-        self.SCI    = self.f_msf / self.FF_fun(self.time)
     
     #%%
-    def AlphaBeta(self):
-        a = np.array([self.p["a0"].value, self.p["a1"].value, self.p["a2"].value]);   
-        b = np.array([self.p["b0"].value, self.p["b1"].value, self.p["b2"].value])
+    # -------------------------------------------------------------------
+    # ------------- ACOUSTIC FEATURES -----------------------------------
+    # -------------------------------------------------------------------
+    # computed on first access and cached in the instance, an assignment (e.g. BirdSong or 
+    # synth.FF -= f0) replaces the cached value
+    @cached_property
+    def stft(self):
+        return librosa.stft(y=self.s, n_fft=self.NN, hop_length=self.hop_length, win_length=self.NN, window='hann',
+                            center=self.center, dtype=None, pad_mode='constant')
+    
+    @cached_property
+    def reassigned(self):
+        # (freqs, times, mags) reassigned spectrogram, librosa gives float64 freqs and times for float32 signals
+        reassigned = librosa.reassigned_spectrogram(self.s, sr=self.fs, S=self.stft, n_fft=self.NN,
+                                        hop_length=self.hop_length, win_length=self.win_length, window='hann', 
+                                        center=self.center, reassign_frequencies=True, reassign_times=True,
+                                        ref_power=1e-06, fill_nan=True, clip=True, dtype=None, pad_mode='constant')
+        return tuple(AsPrecision(x) for x in reassigned)
+    
+    @cached_property
+    def freqs(self):    return self.reassigned[0]
+    @cached_property
+    def times(self):    return self.reassigned[1]
+    @cached_property
+    def Sxx(self):      return self.reassigned[2]
+    @cached_property
+    def Sxx_dB(self):   return librosa.amplitude_to_db(self.Sxx, ref=np.max)
+    @cached_property
+    def FF_coef(self):  return np.abs(self.stft)
+    
+    @cached_property
+    def time(self):
+        # frames times, the number of frames is the one of the stft (and yin) without computing it
+        if self.center: no_frames = 1 + len(self.s)//self.hop_length
+        else:           no_frames = 1 + (len(self.s)-self.NN)//self.hop_length
+        time = librosa.times_like(X=no_frames, sr=self.fs, hop_length=self.hop_length, n_fft=self.NN) #, axis=-1
+        return time - time[0]
+    
+    @cached_property
+    def f_msf(self):
+        # mean spectral frequency of each frame, frames as contiguous rows
+        return NormRows(self.FF_coef.T*self.freq, 1)/NormRows(self.FF_coef.T, 1)
+    
+    @cached_property
+    def centroid(self):
+        return feature.spectral_centroid(y=self.s, sr=self.fs, S=np.abs(self.stft), n_fft=self.NN,
+                                         hop_length=self.hop_length, freq=self.freqs, win_length=self.win_length, 
+                                         window='hann',center=self.center, pad_mode='constant')[0]
+    @cached_property
+    def mfccs(self):
+        return feature.mfcc(y=self.s, sr=self.fs, S=self.stft, n_mfcc=self.n_mfcc, dct_type=2, norm='ortho', lifter=0)
+    
+    @cached_property
+    def rms(self):
+        return feature.rms(y=self.s, S=self.stft, frame_length=self.NN, hop_length=self.hop_length,
+                           center=self.center, pad_mode='constant')[0]
+    @cached_property
+    def s_mel(self):
+        return feature.melspectrogram(y=self.fs, sr=self.fs, S=self.stft, n_fft=self.NN, hop_length=self.hop_length,
+                                      win_length=self.win_length, window='hann', center=self.center, pad_mode='constant', power=2.0)
+    
+    # ------------- fundamental frequency --------------
+    def _yin(self):
+        return yin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
+                   win_length=self.win_length, hop_length=self.hop_length, center=self.center,
+                   trough_threshold=self.umbral_FF, pad_mode='constant')
+    
+    def _pyin(self):
+        FF,_,_ = pyin(self.s, fmin=self.flim[0], fmax=self.flim[1], sr=self.fs, frame_length=self.NN, 
+                      win_length=self.win_length, hop_length=self.hop_length, n_thresholds=100, beta_parameters=(2, 18), 
+                      boltzmann_parameter=2, resolution=0.1, max_transition_rate=35.92, switch_prob=0.01, 
+                      no_trough_prob=0.01, fill_na=0, center=self.center, pad_mode='constant')
+        return FF
+    
+    @cached_property
+    def FF(self):
+        if   self.ff_method=="pyin": return self._pyin()
+        elif self.ff_method=="yin":  return self._yin()
+        elif self.ff_method=="both": return self._pyin()    # yin in FF2
+        elif self.ff_method=="manual":
+            print("Not implemented yet.")
+    
+    @cached_property
+    def FF2(self):   return self._yin()
+    @cached_property
+    def timeFF(self): return np.linspace(0,self.time[-1],self.FF.size)
+    @cached_property
+    def FF_fun(self): return interp1d(self.timeFF, self.FF)
+    @cached_property
+    def SCI(self):    return self.f_msf / self.FF_fun(self.time)
+    
+    @cached_property
+    def FF_shape(self):  # FF polynomial fit used as beta shape, reused by every Solve
+        poly = Polynomial.fit(self.timeFF, self.FF, deg=10)
+        return poly.linspace(np.size(self.s))[1]
+    
+    # acoustic descriptors of the syllable, the keys of FitDatabase (warm start)
+    def Descriptors(self):
+        # FF mean, std and slope (Hz, Hz/s), duration (s) and bandwidth (FF range, as DefineSyllable)
+        FF    = np.asarray(self.FF, dtype=float)
+        valid = np.isfinite(FF) & (FF>0)
+        FF, timeFF = FF[valid], self.timeFF[valid]
+        slope = np.polyfit(timeFF, FF, 1)[0] if FF.size>1 else 0.
+        return np.array([FF.mean(), FF.std(), slope, self.T, FF.max()-FF.min()])
+    
+    def FeatureVector(self, points=5):
+        # fixed length summary of the syllable (InferenceModel inputs): descriptors, FF at points
+        # equally spaced times, mean and std of f_msf and SCI, mean and std of each mfcc
+        FF   = np.asarray(self.FF, dtype=float)
+        x    = np.linspace(0, 1, FF.size)
+        FF_t = np.interp(np.linspace(0, 1, points), x[np.isfinite(FF)], FF[np.isfinite(FF)])
+        mfccs = np.abs(self.mfccs)     # complex, they come from the stft
+        return np.concatenate([self.Descriptors(), FF_t, [np.nanmean(self.f_msf), np.nanstd(self.f_msf)],
+                               [np.nanmean(self.SCI), np.nanstd(self.SCI)], mfccs.mean(axis=1), mfccs.std(axis=1)])
+    
+    #%%
+    def AlphaBeta(self, p_array=None):
+        # p_array = None uses self.p, otherwise a (N x 6) array of (a0,a1,a2,b0,b1,b2) and
+        # alpha, beta are returned as (N x samples) arrays without modifying self
+        if p_array is None:
+            a = np.array([self.p["a0"].value, self.p["a1"].value, self.p["a2"].value]);   
+            b = np.array([self.p["b0"].value, self.p["b1"].value, self.p["b2"].value])
+        else:
+            p_array = np.atleast_2d(np.array(p_array, dtype=float))
+            a, b    = p_array[:,:3], p_array[:,3:6]
         
         t_1   = np.linspace(0,self.T,len(self.s))   
         t_par = np.array([np.ones(t_1.size), t_1, t_1**2])
         
-        self.alpha = np.dot(a, t_par);  # lines (or parabolas)
+        alpha = np.dot(a, t_par);  # lines (or parabolas)
         
         # define by same shape as fudamenta frequency
         if "syllable" in self.id: 
-            poly = Polynomial.fit(self.timeFF, self.FF, deg=10)
-            x, y = poly.linspace(np.size(self.s))
-            self.beta  = b[0] + b[1]*(1e-4*y) + b[2]*(1e-4*y)**2   
+            y    = self.FF_shape
+            b    = b.T[..., np.newaxis] if p_array is not None else b
+            beta = b[0] + b[1]*(1e-4*y) + b[2]*(1e-4*y)**2   
         elif "chunck" in self.id: 
-            self.beta = np.dot(b, t_par);
+            beta = np.dot(b, t_par);
 
+        if p_array is not None: return alpha, beta
+        
+        self.alpha, self.beta = alpha, beta
         return self.alpha, self.beta
             
     #%%
-    def MotorGestures(self, alpha, beta, gamma, ovfs=20, prct_noise=0):  # ovfs:oversamp
-        t, tmax, dt = 0, int(self.s.size)*ovfs-1, 1./(ovfs*self.fs) # t0, tmax, td
-        # pback and pin vectors initialization
-        pi, pb, out = np.zeros(tmax), np.zeros(tmax), np.zeros(int(self.s.size))
-        # initial vector ODEs (v0), it is not too relevant
-        v = 1e-4*np.array([1e2, 1e1, 1, 1, 1, 1]);  self.Vs = [v];
+    def Fidelity(self, NN=None, ovfs=None):
+        # copy of the syllable whose Solve is cheaper: motor gestures with ovfs oversampling and
+        # features (of the copy and its synthetic syllables) with an NN points FFT. The beta shape
+        # (FF_shape) is the one of self, so the copy solves the same motor gestures
+        self.FF_shape
+        low = copy.copy(self)
+        if NN is not None:
+            low.NN, low.win_length, low.hop_length, low.no_overlap = NN, NN//2, NN//4, NN//2
+            low.freq = librosa.fft_frequencies(sr=low.fs, n_fft=NN)
+            for name in FEATURES: low.__dict__.pop(name, None)
+        if ovfs is not None: low.ovfs = ovfs
+        return low
+    
+    #%%
+    def Oscillating(self, alpha, beta):
+        # samples of alpha, beta inside the oscillating region of the labia: right of the Hopf
+        # line (alpha>0) and above the saddle-node curve (alpha>mu1(beta), beta<1/3). The other
+        # regions end in a fixed point, the synthetic syllable is silent
+        alpha, beta = np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float)
+        if not self.default_labia: return np.ones(np.broadcast(alpha, beta).shape, dtype=bool)
+        mu1 = np.interp(beta, self.beta_bif, np.max(self.mu1_curves, axis=0), right=-np.inf)
+        return (alpha>0) & (alpha>mu1)
+    
+    def Silent(self, p):
+        # True if the alpha(t), beta(t) of the parameters p never reach the oscillating region,
+        # so the motor gestures can be skipped
+        if self.s.size < 2*self.fs/100: self.id = "chunck"
+        else:                           self.id = "syllable"
+        alpha, beta = self.AlphaBeta([p[key].value for key in ("a0","a1","a2","b0","b1","b2")])
+        return not self.Oscillating(alpha, beta).any()
+    
+    #%%
+    def BetaFromFF(self, gamma=None):
+        # labial tension beta(t) whose oscillation frequency (FrequencyMap) is the smoothed FF
+        # (FF_shape) at the alpha(t) of self.p and gamma (self.p["gm"] by default), one value per sample.
+        # Below the lowest frequency of the map it is the lowest oscillating beta, above it the highest
+        if gamma is None: gamma = self.p["gm"].value
+        if self.s.size < 2*self.fs/100: self.id = "chunck"
+        else:                           self.id = "syllable"
+        alphas, betas, freqs = FrequencyMap(*self.f1f2)
+        alpha, _ = self.AlphaBeta([self.p[key].value for key in ("a0","a1","a2","b0","b1","b2")])
+        # frequencies over the betas at the alpha of each sample (rows), nondecreasing in beta
+        i    = np.interp(alpha[0], alphas, np.arange(alphas.size))
+        i0   = np.minimum(i.astype(int), alphas.size-2);  w = (i-i0)[:, np.newaxis]
+        rows = np.nan_to_num((1-w)*freqs[i0] + w*freqs[i0+1], nan=-np.inf)
+        target = self.FF_shape/gamma
+        
+        j  = np.clip((rows<target[:, np.newaxis]).sum(axis=1), 1, betas.size-1)
+        n  = np.arange(target.size)
+        f0, f1 = rows[n, j-1], rows[n, j]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            beta = betas[j-1] + (betas[j]-betas[j-1])*np.clip((target-f0)/(f1-f0), 0, 1)
+        beta = np.where(np.isinf(f0), betas[j], beta)                  # below the map
+        beta = np.where(np.isinf(f1), np.nan, beta)                    # alpha never oscillates
+        return beta
+    
+    def BsFromFF(self, gamma=None):
+        # b0, b1, b2 whose beta (AlphaBeta) best fits BetaFromFF, least squares within their bounds
+        beta  = self.BetaFromFF(gamma)
+        valid = np.isfinite(beta)
+        if not valid.any(): return np.array([self.p[key].value for key in ("b0","b1","b2")])
+        if "syllable" in self.id: x = 1e-4*self.FF_shape
+        else:                     x = np.linspace(0, self.T, len(self.s))
+        keys = ("b0","b1","b2")
+        return lsq_linear(np.array([np.ones(x.size), x, x**2]).T[valid], beta[valid],
+                          bounds=([self.p[key].min for key in keys], [self.p[key].max for key in keys])).x
+    
+    #%%
+    @Timed()
+    def MotorGestures(self, alpha, beta, gamma, ovfs=20, prct_noise=0, engine=None, record=None):  # ovfs:oversamp
+        out, Vs = self.Trajectory(alpha, beta, gamma, ovfs=ovfs, engine=engine, record=record)
+        # define solution (synthetic syllable) as a Syllable object 
+        synth = self.SynthSyllable(out)
+        
+        synth.alpha = self.alpha
+        synth.beta  = self.beta
+        # motor gestures inputs, to record the trajectory later (RecordVs) if it was not recorded,
+        # the labia ODEs, BirdData and model are the ones of self (SynthSyllable)
+        synth.gamma, synth.ovfs, synth.source_envelope = gamma, ovfs, self.envelope
+        
+        if record is None: record = self.record
+        synth.Vs      = Vs
+        synth.Vs_vars = self.RecordVars()
+        synth.timesVs = TimesVs(record, self.T, len(self.s), ovfs)
+        #delattr(self,"alpha"); delattr(self,"beta")
+
+        return synth
+
+    #%%
+    @Timed()
+    def Trajectory(self, alpha, beta, gamma, ovfs=20, engine=None, record=None, envelope=None, model="bird"):
         # ------------- BIRD PARAMETERS -----------
         #BirdData = pd.read_csv(self.paths.auxdata/'ZonotrichiaData.csv')
-        c, L, r, Ch = self.BirdData['C'], self.BirdData['L'], self.BirdData['r'], self.BirdData['Ch']
-        MG, MB, RB, Rh  = self.BirdData['MG'], self.BirdData['MB'], self.BirdData['RB'], self.BirdData['Rh']
-        #c, L, r, Ch, , Rh = BirdData['c'] # c, L, r, c, L1, L2, r2, rd 
         # - Trachea:
         #           r: reflection coeficient    [adimensionelss]
         #           L: trachea length           [m]
@@ -270,51 +472,59 @@ class Syllable(object):
         #           MG: Glottis Inertance       [Pa s^2/m^3 = kg/m^4]
         #           RB: Beak Resistance         [Pa s/m^3 = kg/m^4 s]
         #           Rh: OEC Resistence          [Pa s/m^3 = kg/m^4 s]
-        # ------------------------------ ODEs -----------------------------
-        def ODEs(v):
-            dv, [x, y, pout, i1, i2, i3] = np.zeros(6), v  # (x, y, pout, i1, i2, i3)'
-            # ----------------- direct implementation of the EDOs -----------
-            # dv[0] = y
-            # dv[1] = (-self.alpha[t//ovfs]-self.beta[t//ovfs]*x-x**3+x**2)*self.p["gm"].value**2 - (x**2*y+x*y)*self.p["gm"].value
-            dv[0] = self.f1(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
-            dv[1] = self.f2(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
-            # ------------------------- trachea ------------------------
-            pbold = pb[t]                                 # pressure back before
-            # Pin(t) = Ay(t)+pback(t-L/C) = envelope_Signal*v[1]+pb[t-L/C/dt]
-            pi[t] = (.5*self.envelope[t//ovfs])*dv[1] + pb[t-int(L/c/dt)] 
-            pb[t] = -r*pi[t-int(L/c/dt)]                          # pressure back after: -rPin(t-L/C) 
-            pout  = (1-r)*pi[t-int(L/c/dt)]                       # pout
-            # ---------------------------------------------------------------
-            dv[2] = (pb[t]-pbold)/dt                      # dpout
-            dv[3] = i2
-            dv[4] = -(1/Ch/MG)*i1 - Rh*(1/MB+1/MG)*i2 +(1/MG/Ch+Rh*RB/MG/MB)*i3 \
-                    +(1/MG)*dv[2] + (Rh*RB/MG/MB)*pout
-            dv[5] = -(MG/MB)*i2 - (Rh/MB)*i3 + (1/MB)*pout
-            return dv        
         # ----------------------- Solving EDOs ----------------------
-        while t < tmax: # and v[1] > -5e6:  # labia velocity not too fast
-            v = rk4(ODEs, v, dt);  self.Vs.append(v)  # RK4 - step
-            out[t//ovfs] = RB*v[-1]               # output signal (synthetic) 
-            t += 1;
-            
-            # # if the bird OEC change of size in time
-            # BirdData = pd.read_csv(self.paths.auxdata/'ZonotrichiaData.csv')
-            # c, L, r, Ch, MG, MB, RB, Rh = BirdData['value'] # c, L, r, c, L1, L2, r2, rd 
+        # engine: "python" (reference loop), "numba" (compiled kernel) or "auto"
+        if engine is None:   engine   = self.engine
+        if record is None:   record   = self.record
+        if envelope is None: envelope = self.envelope
+        integrator = GetEngine(engine, model=model)
         
-        # ------------------------------------------------------------
-        self.Vs = np.array(self.Vs)
-        # define solution (synthetic syllable) as a Syllable object 
-        synth = Syllable(Nt=self.Nt, llambda=self.llambda, NN=self.NN, overlap=0.5, file_name=self.file_name, t0_bs=self.t0_bs+self.t0,
-                         paths=self.paths, flim=self.flim, sfs=[out, self.fs], umbral_FF=self.umbral_FF)
+        # the integrations without recording are cached, same inputs (alpha and beta come from
+        # the syllable samples and parameters) and same engine give the same signal
+        if self.cache is not None and RecordBuffer(record, 0, ovfs)[0]==RECORD_OFF:
+            key = self.cache.Key(model, integrator.__module__+"."+integrator.__name__, _Source(self.f1), _Source(self.f2),
+                                 np.asarray(alpha, dtype=float), np.asarray(beta, dtype=float), float(gamma),
+                                 np.asarray(envelope, dtype=float), self.fs, self.BirdData, ovfs)
+            out = self.cache.Get(key)
+            Event("cache hit" if out is not None else "cache miss")
+            if out is None:
+                out, _ = integrator(self.f1, self.f2, alpha, beta, gamma, envelope, self.fs, self.BirdData, ovfs=ovfs, record=record)
+                self.cache.Put(key, out)
+            return out, None
         
-        synth.id    = self.id
-        synth.Vs    = self.Vs
-        synth.alpha = self.alpha
-        synth.beta  = self.beta
+        return integrator(self.f1, self.f2, alpha, beta, gamma, envelope, self.fs, self.BirdData, ovfs=ovfs,
+                          record=record, record_vars=self.record_vars, record_dtype=self.record_dtype)
+    
+    #%%
+    def RecordVars(self):
+        # indexes of the state variables recorded in Vs
+        names = STATE_VARS[self.model]
+        if self.record_vars is None: return list(range(len(names)))
+        return [names.index(v) if isinstance(v, str) else int(v) for v in self.record_vars]
+    
+    #%%
+    def RecordVs(self, record="audio", record_vars=None, record_dtype=None, engine=None):
+        # integrate again the motor gestures of a synthetic syllable recording its trajectory (Vs), with
+        # the labia ODEs (f1f2), BirdData and model of the syllable it was synthesized from
+        if record_dtype is None: record_dtype = PRECISION["float"] or np.float64
+        self.record_vars, self.record_dtype = record_vars, record_dtype
+        _, self.Vs   = self.Trajectory(self.alpha, self.beta, self.gamma, ovfs=self.ovfs, engine=engine,
+                                       record=record, envelope=self.source_envelope, model=self.model)
+        self.Vs_vars = self.RecordVars()
+        self.timesVs = TimesVs(record, self.T, len(self.s), self.ovfs)
         
-        synth.timesVs = np.linspace(0, len(self.s)/self.fs, len(self.s)*ovfs)
-        #delattr(self,"alpha"); delattr(self,"beta")
+        return self.Vs
 
+    #%%
+    def SynthSyllable(self, out):
+        # synthetic signal (out) as a Syllable object with the same analysis parameters, labia ODEs,
+        # BirdData and model of self
+        synth = Syllable(Nt=self.Nt, llambda=self.llambda, NN=self.NN, overlap=0.5, file_name=self.file_name, t0_bs=self.t0_bs+self.t0,
+                         paths=self.paths, flim=self.flim, sfs=[out, self.fs], umbral_FF=self.umbral_FF, engine=self.engine,
+                         cache=self.cache if self.cache is not None else False,
+                         f1f2=None if self.default_labia else self.f1f2, BirdData=self.BirdData)
+        synth.id, synth.model = self.id, self.model
+        
         return synth
 
     #%%    
@@ -323,14 +533,16 @@ class Syllable(object):
         WriteAudio(name, fs=self.fs, s=self.s)
 
     #%%    
-    def Solve(self, p, orde=2, BirdData=None):
+    @Timed()
+    def Solve(self, p, orde=2, BirdData=None, record=None, scores=None, compact=False, features=()):
+        # compact=True returns a SynthResult (signal, scores and the listed features) instead of the synthetic Syllable
         self.p = p;  self.ord = orde; 
         if self.s.size < 2*self.fs/100: self.id = "chunck"
         else:                           self.id = "syllable"
 
         self.AlphaBeta()             # define alpha and beta parameters
-        synth = self.MotorGestures(self.alpha, self.beta, self.p["gm"].value) # solve the problem and define the synthetic syllable
-        synth = self.SynthScores(synth, orde=orde) # compute differences and score variables
+        synth = self.MotorGestures(self.alpha, self.beta, self.p["gm"].value, ovfs=self.ovfs, record=record) # solve the problem and define the synthetic syllable
+        synth = self.SynthScores(synth, orde=orde, scores=scores) # compute differences and score variables
         synth.paths = self.paths
         synth.p = self.p
         #synth.t_interval = self.t_interval
@@ -348,8 +560,55 @@ class Syllable(object):
         if BirdData is not None: 
             for k in BirdData.keys():  synth.BirdData[k] = BirdData[k]
 
+        if compact: return SynthResult(synth, self, scores=scores, features=features)
         return synth
     
+    #%%
+    @Timed()
+    def SolveBatch(self, p_array, orde=2, ovfs=None, engine=None, scores=None):
+        """
+        Solve N parameter sets at once. The motor gestures of all candidates are integrated
+        together as a (N x 6) state array, then every synthetic signal is scored against self.
+        INPUT:
+            p_array = (N x 6) or (N x 7) array with (a0,a1,a2,b0,b1,b2[,gm]) per row,
+                      without gm column the value of self.p["gm"] is used
+            ovfs    = oversampling of the integration, None for self.ovfs (the one of Solve)
+        OUTPUT:
+            outs   = (N x samples) synthetic signals
+            scores = DataFrame with the parameters and scores of each candidate,
+                     only the listed scores if scores is given (default BATCH_SCORES)
+        """
+        self.ord = orde
+        if self.s.size < 2*self.fs/100: self.id = "chunck"
+        else:                           self.id = "syllable"
+        
+        p_array = np.atleast_2d(np.array(p_array, dtype=float))
+        if p_array.shape[1]>6: gammas = p_array[:,6]
+        else:                  gammas = np.full(p_array.shape[0], self.p["gm"].value)
+        
+        alphas, betas = self.AlphaBeta(p_array)
+        if engine is None: engine = self.engine
+        if ovfs is None:   ovfs   = self.ovfs
+        integrator = GetEngine(engine, model="bird-batch")
+        outs = integrator(self.f1, self.f2, alphas, betas, gammas, self.envelope, self.fs, self.BirdData, ovfs=ovfs)
+        outs = AsPrecision(outs)
+        
+        keys   = BATCH_SCORES if scores is None else scores
+        scores = []
+        for i in range(outs.shape[0]):
+            synth = self.SynthScores(self.SynthSyllable(outs[i]), orde=orde, scores=keys)
+            scores.append({key:getattr(synth, key) for key in keys})
+        scores = pd.DataFrame(scores, columns=keys)
+        for i, key in enumerate(["a0","a1","a2","b0","b1","b2"]): scores.insert(i, key, p_array[:,i])
+        scores.insert(6, "gm", gammas)
+        
+        return outs, scores
+    
+    #%%
+    def Reference(self):
+        # compact and picklable copy of the inputs of Solve, see SolveReference
+        return Reference(self)
+    
     #%%
     def ExportMotorGestures(self):
         # ------------ export p values and alpha-beta arrays ------------
@@ -363,11 +622,11 @@ class Syllable(object):
         df_MotorGestures_coef.to_csv(self.paths.MG_param / name, index=True)
 
     #%%
-    def SolveAB(self, alpha, beta, gamma, orde=2):
+    def SolveAB(self, alpha, beta, gamma, orde=2, record=None, scores=None):
         self.alpha = alpha; self.beta  = beta;
         
-        synth = self.MotorGestures(alpha, beta, gamma)
-        synth = self.SynthScores(synth, orde=orde)
+        synth = self.MotorGestures(alpha, beta, gamma, record=record)
+        synth = self.SynthScores(synth, orde=orde, scores=scores)
         synth.id = "synth-birdsongs"
         
         return synth
@@ -376,12 +635,13 @@ class Syllable(object):
     def Play(self): playsound(self.file_name)
     
     #%%
-    def SynthScores(self, synth, orde=2):
-        synth.ord=self.ord=orde;  # order of score norms
+    @Timed()
+    def SynthScores(self, synth, orde=2, scores=None):
+        # scores = None computes all the scores, otherwise only the features and deltas
+        # needed by the listed scores (see SCORES), e.g. scores=["scoreFF"] only needs FF
+        synth.ord=orde;  # order of score norms, self is not modified (SolveReference)
+        groups = ScoreGroups(scores)
         # deltaNOP    = np.abs(synth.NOP-self.NOP).astype(float)
-        deltaSxx    = np.abs(synth.Sxx_dB-self.Sxx_dB)
-        deltaMel    = np.abs(synth.FF_coef-self.FF_coef)
-        deltaMfccs  = np.abs(synth.mfccs-self.mfccs)
         
         # synth.deltaFmsf     = np.abs(synth.f_msf-self.f_msf)
         # synth.deltaSCI      = np.abs(synth.SCI-self.SCI)
@@ -394,60 +654,77 @@ class Syllable(object):
         # synth.deltaMel      = deltaMel/np.max(deltaMel)
         # synth.deltaMfccs    = deltaMfccs/np.max(deltaMfccs)
 
-        synth.deltaFmsf     = np.abs(synth.f_msf-self.f_msf)/self.f_msf
-        synth.deltaSCI      = np.abs(synth.SCI-self.SCI)/self.SCI
-        synth.deltaEnv      = np.abs(synth.envelope-self.envelope)/self.envelope
-        synth.deltaFF       = np.abs(synth.FF-self.FF)/self.FF
-        synth.deltaRMS      = np.abs(synth.rms-self.rms)/self.rms
-        synth.deltaCentroid = np.abs(synth.centroid-self.centroid)/self.centroid
-        synth.deltaF_msf    = np.abs(synth.f_msf-self.f_msf)/self.f_msf
-        synth.deltaSxx      = deltaSxx/np.max(deltaSxx)
-        synth.deltaMel      = deltaMel/np.max(deltaMel)
-        synth.deltaMfccs    = deltaMfccs/np.max(deltaMfccs)
-            
-        synth.scoreSCI      = Norm(synth.deltaSCI,      ord=self.ord)/synth.deltaSCI.size
-        synth.scoreFF       = Norm(synth.deltaFF,       ord=self.ord)/synth.deltaFF.size
-        synth.scoreEnv      = Norm(synth.deltaEnv,      ord=self.ord)/synth.deltaEnv.size
-        synth.scoreRMS      = Norm(synth.deltaRMS,      ord=self.ord)/synth.deltaRMS.size
-        synth.scoreCentroid = Norm(synth.deltaCentroid, ord=self.ord)/synth.deltaCentroid.size
-        synth.scoreF_msf    = Norm(synth.deltaF_msf,    ord=self.ord)/synth.deltaF_msf.size
-        synth.scoreSxx      = Norm(synth.deltaSxx,      ord=np.inf)/synth.deltaSxx.size
-        synth.scoreMel      = Norm(synth.deltaMel,      ord=np.inf)/synth.deltaSxx.size
-        synth.scoreMfccs    = Norm(synth.deltaMfccs,    ord=np.inf)/synth.deltaMfccs.size
-        
+        if "FF" in groups:
+            synth.deltaFF       = np.abs(synth.FF-self.FF)/self.FF
+            synth.scoreFF       = Norm(synth.deltaFF,       ord=synth.ord)/synth.deltaFF.size
+            synth.deltaFF_mean  = synth.deltaFF.mean()
+        if "SCI" in groups:
+            synth.deltaSCI      = np.abs(synth.SCI-self.SCI)/self.SCI
+            synth.scoreSCI      = Norm(synth.deltaSCI,      ord=synth.ord)/synth.deltaSCI.size
+            synth.deltaSCI_mean = synth.deltaSCI.mean()
+        if "Env" in groups:
+            synth.deltaEnv      = np.abs(synth.envelope-self.envelope)/self.envelope
+            synth.scoreEnv      = Norm(synth.deltaEnv,      ord=synth.ord)/synth.deltaEnv.size
+            synth.deltaEnv_mean = synth.deltaEnv.mean()
+        if "RMS" in groups:
+            synth.deltaRMS      = np.abs(synth.rms-self.rms)/self.rms
+            synth.scoreRMS      = Norm(synth.deltaRMS,      ord=synth.ord)/synth.deltaRMS.size
+            synth.scoreRMS_mean = synth.scoreRMS.mean()
+        if "Centroid" in groups:
+            synth.deltaCentroid = np.abs(synth.centroid-self.centroid)/self.centroid
+            synth.scoreCentroid = Norm(synth.deltaCentroid, ord=synth.ord)/synth.deltaCentroid.size
+            synth.scoreCentroid_mean = synth.scoreCentroid.mean()
+        if "F_msf" in groups:
+            synth.deltaFmsf     = np.abs(synth.f_msf-self.f_msf)/self.f_msf
+            synth.deltaF_msf    = np.abs(synth.f_msf-self.f_msf)/self.f_msf
+            synth.scoreF_msf    = Norm(synth.deltaF_msf,    ord=synth.ord)/synth.deltaF_msf.size
+            synth.scoreF_msf_mean = synth.deltaF_msf.mean()
+        if "Sxx" in groups:
+            deltaSxx            = np.abs(synth.Sxx_dB-self.Sxx_dB)
+            synth.deltaSxx      = deltaSxx/np.max(deltaSxx)
+            synth.scoreSxx      = Norm(synth.deltaSxx,      ord=np.inf)/synth.deltaSxx.size
+        if "Mel" in groups:
+            deltaMel            = np.abs(synth.FF_coef-self.FF_coef)
+            synth.deltaMel      = deltaMel/np.max(deltaMel)
+            synth.scoreMel      = Norm(synth.deltaMel,      ord=np.inf)/synth.deltaMel.size
+        if "Mfccs" in groups:
+            deltaMfccs          = np.abs(synth.mfccs-self.mfccs)
+            synth.deltaMfccs    = deltaMfccs/np.max(deltaMfccs)
+            synth.scoreMfccs    = Norm(synth.deltaMfccs,    ord=np.inf)/synth.deltaMfccs.size
         # synth.scoreNoHarm        = deltaNOP*10**(deltaNOP-2)
-        synth.deltaSCI_mean      = synth.deltaSCI.mean()
-        synth.deltaFF_mean       = synth.deltaFF.mean()
-        synth.scoreRMS_mean      = synth.scoreRMS.mean()
-        synth.scoreCentroid_mean = synth.scoreCentroid.mean()
-        synth.deltaEnv_mean      = synth.deltaEnv.mean()
-        synth.scoreF_msf_mean    = synth.deltaF_msf.mean()
         
         # -------         acoustic dissimilarity --------------------
-        synth.correlation = np.zeros_like(self.time)
-        synth.Df          = np.zeros_like(self.time)
-        synth.SKL         = np.zeros_like(self.time)
-        for i in range(synth.mfccs.shape[1]):
-            x, y = self.mfccs[:,i], synth.mfccs[:,i]
-            r = Norm(x*y,ord=1)/(Norm(x,ord=2)*Norm(y,ord=2))
-            #print(Norm(x*y,ord=1), Norm(x,ord=2), Norm(y,ord=2), r)
+        if "dissimilarity" in groups:
+            synth.correlation = np.zeros_like(self.time)
+            synth.Df          = np.zeros_like(self.time)
+            synth.SKL         = np.zeros_like(self.time)
+            # all the mfccs frames at once, one frame per row
+            x, y = self.mfccs.T, synth.mfccs.T
+            n    = y.shape[0]
+            r    = NormRows(x*y, ord=1)/(NormRows(x, ord=2)*NormRows(y, ord=2))
+            # single precision mfccs (float32 audio of librosa, SetPrecision("float32")) round r up to
+            # ~1e-7 above 1 on (almost) equal frames, within that rounding 1-r is 0 and not NaN
+            eps  = max(np.finfo(x.dtype).eps, np.finfo(y.dtype).eps)
+            if eps > np.finfo(np.float64).eps: r = np.where((r>1) & (r-1<=16*eps), 1., r)
+            
+            synth.correlation[:n] = np.sqrt(1-r)
+            synth.Df[:n]          = 0.5*NormRows(x*np.log2(np.abs(x/y))+y*np.log2(np.abs(y/x)), ord=1)
+            synth.SKL[:n]         = 0.5*NormRows(np.abs(x-y), ord=1)
             
-            synth.correlation[i] = np.sqrt(1-r)
-            synth.Df[i]          = 0.5*Norm(x*np.log2(np.abs(x/y))+y*np.log2(np.abs(y/x)), ord=1)
-            synth.SKL[i]         = 0.5*Norm(np.abs(x-y), ord=1)
-        
             #synth.Df[np.argwhere(np.isnan(synth.Df))]=-10
-        
-        #synth.correlation /= synth.correlation.max()
-        synth.SKL         /= synth.SKL.max()
-        synth.Df          /= synth.Df.max()
+            
+            #synth.correlation /= synth.correlation.max()
+            synth.SKL         /= synth.SKL.max()
+            synth.Df          /= synth.Df.max()
 
-        synth.scoreCorrelation = Norm(synth.correlation, ord=self.ord)/synth.correlation.size
-        synth.scoreSKL         = Norm(synth.SKL, ord=self.ord)/synth.SKL.size
-        synth.scoreDF          = Norm(synth.Df, ord=self.ord)/synth.Df.size
+            synth.scoreCorrelation = Norm(synth.correlation, ord=synth.ord)/synth.correlation.size
+            synth.scoreSKL         = Norm(synth.SKL, ord=synth.ord)/synth.SKL.size
+            synth.scoreDF          = Norm(synth.Df, ord=synth.ord)/synth.Df.size
 
-        synth.residualCorrelation = synth.scoreFF-np.mean(synth.correlation+synth.Df +synth.scoreSKL)
-        synth.SCIFF = synth.scoreSCI + synth.scoreFF
+        if "residualCorrelation" in groups:
+            synth.residualCorrelation = synth.scoreFF-np.mean(synth.correlation+synth.Df +synth.scoreSKL)
+        if "SCIFF" in groups:
+            synth.SCIFF = synth.scoreSCI + synth.scoreFF
 
         return synth
 
@@ -463,14 +740,185 @@ class Syllable(object):
         if len(p_array)>6: 
             self.p["gm"].set(value=p_array[6])
 
+# lazy acoustic features, they depend on the analysis resolution (NN)
+FEATURES = [name for name, value in vars(Syllable).items() if isinstance(value, cached_property) and name!="FF_shape"]
+
+# the computation of each feature is a Profiler stage (Syllable.<feature>)
+for _name in FEATURES:
+    _feature = cached_property(Timed("Syllable."+_name)(vars(Syllable)[_name].func))
+    _feature.__set_name__(Syllable, _name)
+    setattr(Syllable, _name, _feature)
+
+#%%
+_REFERENCE_SYLLABLES = OrderedDict()   # syllables rebuilt from References in this process, by key
+
+class Reference(object):
+    """
+    Compact and picklable inputs of a syllable solve: samples, sampling rate, envelope, FF, model
+    constants and the analysis and integration settings. It is what SolveReference needs, so it can be
+    sent to worker processes or shared by threads instead of the whole Syllable (or Optimizer)
+    INPUT:
+        syllable = Syllable of the reference (its parameters p are the defaults of SolveReference)
+    """
+    __slots__ = ("s", "fs", "envelope", "FF", "FF_shape", "id", "p", "f1f2", "BirdData", "NN", "Nt", "llambda",
+                 "flim", "center", "n_mfcc", "n_mels", "umbral_FF", "ff_method", "ovfs", "engine", "cache", "key")
+    
+    def __init__(self, syllable):
+        self.s, self.fs, self.envelope = syllable.s, syllable.fs, syllable.envelope
+        self.FF, self.FF_shape = syllable.FF, syllable.FF_shape
+        self.id       = "chunck" if syllable.s.size < 2*syllable.fs/100 else "syllable"   # as Solve
+        self.p        = copy.deepcopy(syllable.p)
+        self.f1f2     = None if syllable.default_labia else syllable.f1f2
+        self.BirdData = dict(syllable.BirdData)
+        self.NN, self.Nt, self.llambda, self.flim = syllable.NN, syllable.Nt, syllable.llambda, syllable.flim
+        self.center, self.n_mfcc, self.n_mels     = syllable.center, syllable.n_mfcc, syllable.n_mels
+        self.umbral_FF, self.ff_method            = syllable.umbral_FF, syllable.ff_method
+        self.ovfs, self.engine = syllable.ovfs, syllable.engine
+        self.cache    = syllable.cache is not None        # the SOLVE_CACHE of each process
+        self.key      = SolveCache.Key(self.s, self.fs, self.envelope, self.FF, self.id, self.f1f2, self.BirdData,
+                                       self.NN, self.Nt, self.llambda, self.flim, self.center, self.n_mfcc, self.n_mels,
+                                       self.umbral_FF, self.ff_method, self.ovfs, self.engine, self.cache)
+    
+    def __getstate__(self): return {name:getattr(self, name) for name in self.__slots__}
+    def __setstate__(self, state):
+        for name, value in state.items(): setattr(self, name, value)
+    
+    def Values(self, p):
+        # (a0,a1,a2,b0,b1,b2,gm,f0) of lmfit.Parameters or of a shorter vector, completed with the reference p
+        if isinstance(p, lmfit.Parameters): return np.array([p[key].value for key in PARAMS], dtype=float)
+        values = np.array([self.p[key].value for key in PARAMS], dtype=float)
+        p      = np.ravel(np.array(p, dtype=float))
+        values[:p.size] = p
+        return values
+    
+    def Parameters(self, values):
+        # copy of the reference p with the values of a parameter vector
+        p = copy.deepcopy(self.p)
+        for key, value in zip(PARAMS, values): p[key].set(value=float(value))
+        return p
+    
+    def Syllable(self, maxsize=8):
+        # Syllable of the reference, rebuilt once per process (the maxsize last ones are kept), read only
+        syllable = _REFERENCE_SYLLABLES.get(self.key)
+        if syllable is None:
+            syllable = Syllable(sfs=[self.s, self.fs], NN=self.NN, Nt=self.Nt, llambda=self.llambda, flim=self.flim,
+                                n_mfcc=self.n_mfcc, n_mels=self.n_mels, umbral_FF=self.umbral_FF, ff_method=self.ff_method,
+                                ide=self.id, f1f2=self.f1f2, BirdData=self.BirdData, engine=self.engine, t0_bs=0,
+                                cache=self.cache)
+            syllable.center, syllable.envelope, syllable.ovfs = self.center, self.envelope, self.ovfs
+            syllable.FF, syllable.FF_shape = self.FF, self.FF_shape
+            syllable.p = copy.deepcopy(self.p)
+            _REFERENCE_SYLLABLES[self.key] = syllable
+            while len(_REFERENCE_SYLLABLES) > maxsize: _REFERENCE_SYLLABLES.popitem(last=False)
+        return syllable
+
+def SolveReference(reference, p, orde=2, scores=None, compact=False, features=()):
+    """
+    Syllable.Solve without side effects: nothing is stored in the reference nor in the syllable
+    rebuilt from it, so it can run in threads and worker processes (the Reference is picklable)
+    INPUT:
+        reference = Reference of the syllable (Syllable.Reference)
+        p         = lmfit.Parameters or vector (a0,a1,a2,b0,b1,b2[,gm[,f0]]), missing values are the reference ones
+        scores    = scores of SynthScores, None computes all of them
+        compact   = return a SynthResult with the signal, scores and features (names) instead of the Syllable
+    OUTPUT:
+        synth = synthetic syllable with its scores, alpha, beta and parameters (synth.p)
+    """
+    syllable    = reference.Syllable()
+    values      = reference.Values(p)
+    alpha, beta = syllable.AlphaBeta(values[:6])
+    alpha, beta = alpha[0], beta[0]
+    out, _      = syllable.Trajectory(alpha, beta, values[6], ovfs=reference.ovfs)
+    
+    synth = syllable.SynthSyllable(out)
+    synth.alpha, synth.beta = alpha, beta
+    synth.gamma, synth.ovfs, synth.source_envelope = values[6], reference.ovfs, syllable.envelope
+    synth = syllable.SynthScores(synth, orde=orde, scores=scores)
+    synth.FF -= values[7]
+    synth.p   = reference.Parameters(values)
+    synth.BirdData = dict(reference.BirdData)
+    
+    if compact: return SynthResult(synth, reference, scores=scores, features=features)
+    return synth
+
+class SynthResult(object):
+    """
+    Compact result of a synthetic evaluation: the synthesized signal, the requested scores and the
+    listed features, instead of the synthetic Syllable with its spectrograms, deltas and Vs.
+    Scores and features read as attributes (result.scoreFF), Syllable() rebuilds the full synthetic syllable
+    INPUT:
+        synth    = scored synthetic Syllable (Syllable.SynthScores)
+        source   = Syllable or Reference it was solved from
+        scores   = scores kept, the ones given to SynthScores (None: all)
+        features = names of the synth arrays kept, e.g. ("FF", "SCI")
+    """
+    __slots__ = ("s", "fs", "scores", "features", "values", "gamma", "ord", "source")
+    
+    def __init__(self, synth, source, scores=None, features=()):
+        self.s, self.fs = synth.s, synth.fs
+        self.scores   = {key:getattr(synth, key) for key in (SCORES if scores is None else scores) if hasattr(synth, key)}
+        self.features = {name:getattr(synth, name) for name in features}
+        # values of the parameters, the Parameters of Solve are the ones the Optimizer keeps modifying
+        self.values   = np.array([synth.p[key].value for key in PARAMS], dtype=float)
+        self.gamma, self.ord = synth.gamma, synth.ord
+        self.source   = source    # shared, alpha and beta are computed again from it and p
+    
+    def __getattr__(self, name):   # only called for the names that are not slots
+        if name not in SynthResult.__slots__:
+            for values in (self.scores, self.features):
+                if name in values: return values[name]
+        raise AttributeError("'SynthResult' has no score or feature '{}'".format(name))
+    
+    def __getstate__(self): return {name:getattr(self, name) for name in self.__slots__}
+    def __setstate__(self, state):
+        for name, value in state.items(): setattr(self, name, value)
+    
+    @property
+    def nbytes(self):   # memory of the kept arrays
+        return sum(np.asarray(value).nbytes for value in [self.s]+list(self.features.values()))
+    
+    def _Source(self):
+        return self.source.Syllable() if isinstance(self.source, Reference) else self.source
+    
+    @property
+    def p(self):   # lmfit.Parameters of the result, bounds of the source
+        p = copy.deepcopy(self.source.p)
+        for key, value in zip(PARAMS, self.values): p[key].set(value=value)
+        return p
+    
+    def AlphaBeta(self):
+        # motor gestures of the result, from the parameters over the source syllable
+        alpha, beta = self._Source().AlphaBeta(self.values[:6])
+        return alpha[0], beta[0]
+    
+    @property
+    def alpha(self): return self.AlphaBeta()[0]
+    @property
+    def beta(self):  return self.AlphaBeta()[1]
+    
+    def Syllable(self, scores=None):
+        # full synthetic Syllable of the result, scored again against its source (scores of SynthScores)
+        source = self._Source()
+        synth  = source.SynthSyllable(self.s)
+        synth.alpha, synth.beta = self.AlphaBeta()
+        synth.gamma, synth.ovfs, synth.source_envelope = self.gamma, source.ovfs, source.envelope
+        synth = source.SynthScores(synth, orde=self.ord, scores=scores)
+        synth.FF -= self.values[7]
+        synth.p   = self.p
+        for name in ("paths", "no_syllable", "ff_method", "state", "country", "type", "id", "BirdData"):
+            if hasattr(source, name): setattr(synth, name, getattr(source, name))
+        if isinstance(getattr(source, "file_name", None), str): synth.file_name = source.file_name[:-4] + "-synth"
+        return synth
+
 #%%
 class Amphibious(Syllable):
     def __init__(self, birdsong=None, t0=0, Nt=100, llambda=1.5, NN=512, overlap=0.5, flim=(1.5e3,2e4), 
                 n_mels=4, umbral_FF=1, tlim=[], sfs=[], no_syllable=0, ide="syllable", 
                 file_name="syllable", paths=None, f1f2=None, type=""):
-        super().__init__(birdsong, t0, Nt, llambda, NN, overlap, flim, 
-                         n_mels, umbral_FF, tlim, sfs, no_syllable, ide, 
-                         file_name, paths, f1f2, type)
+        super().__init__(birdsong=birdsong, t0=t0, Nt=Nt, llambda=llambda, NN=NN, overlap=overlap, flim=flim,
+                         n_mels=n_mels, umbral_FF=umbral_FF, tlim=tlim, sfs=sfs, no_syllable=no_syllable, ide=ide,
+                         file_name=file_name, paths=paths, f1f2=f1f2, type=type)
+        self.model = "amphibious"
         
         self.p.add_many(('a0', 0.11, False, 0.01, 0.25, None, None),
                         ('a1',   0., False,   -2,    2, None, None),
@@ -481,50 +929,39 @@ class Amphibious(Syllable):
                         ('gm',  4e4, False,  1e4,  1e5, None, None))
 
     #%%
-    def MotorGestures(self, alpha, beta, gamma, ovfs=20, prct_noise=0):  # ovfs:oversamp
-        t, tmax, dt = 0, int(self.s.size)*ovfs-1, 1./(ovfs*self.fs) # t0, tmax, td
-        # pback and pin vectors initialization
-        pi, pb, out = np.zeros(tmax), np.zeros(tmax), np.zeros(int(self.s.size))
-        # initial vector ODEs (v0), it is not too relevant
-        v = 1e-4*np.array([1e2, 1e1, 1]);  self.Vs = [v];
-        # ------------- BIRD PARAMETERS -----------
-        c, L, r = 3.43E+02, 2.50E-02, 6.50E-01 
-        # , Ch, MG, MB, RB, Rh = BirdData['value'] # c, L, r, c, L1, L2, r2, rd 
-        # BirdData = pd.read_csv(self.paths.auxdata/'ZonotrichiaData.csv')
-        # - Trachea:
-        #           r: reflection coeficient    [adimensionelss]
-        #           L: trachea length           [m]
-        #           c: speed of sound in media  [m/s]
-        def ODEs(v):
-            dv, [x, y, pout] = np.zeros(3), v  # (x, y, pout)'
-            # ----------------- direct implementation of the EDOs -----------
-            dv[0] = self.f1(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
-            dv[1] = self.f2(x, y, alpha[t//ovfs], beta[t//ovfs], gamma)
-            # ------------------------- trachea ------------------------
-            pbold = pb[t]                                 # pressure back before
-            # Pin(t) = Ay(t)+pback(t-L/C) = envelope_Signal*v[1]+pb[t-L/C/dt]
-            pi[t] = (.5*self.envelope[t//ovfs])*dv[1] + pb[t-int(L/c/dt)] 
-            pb[t] = -r*pi[t-int(L/c/dt)]                          # pressure back after: -rPin(t-L/C) 
-            pout  = (1-r)*pi[t-int(L/c/dt)]                       # pout
-            # ---------------------------------------------------------------
-            dv[2] = (pb[t]-pbold)/dt                      # dpout
-            return dv        
-        # ----------------------- Solving EDOs ----------------------
-        while t < tmax: # and v[1] > -5e6:  # labia velocity not too fast
-            v = rk4(ODEs, v, dt);  self.Vs.append(v)  # RK4 - step
-            out[t//ovfs] = v[-1]               # output signal (synthetic) 
-            t += 1;
-        # ------------------------------------------------------------
-        self.Vs = np.array(self.Vs)
+    @Timed()
+    def MotorGestures(self, alpha, beta, gamma, ovfs=20, prct_noise=0, engine=None, record=None):  # ovfs:oversamp
+        out, Vs = self.Trajectory(alpha, beta, gamma, ovfs=ovfs, engine=engine, record=record)
         # define solution (synthetic syllable) as a Syllable object 
-        synth = Syllable(Nt=self.Nt, llambda=self.llambda, NN=self.NN, overlap=0.5, flim=self.flim, sfs=[out, self.fs])
+        synth = self.SynthSyllable(out)
+        # motor gestures inputs, to record the trajectory later (RecordVs)
+        synth.gamma, synth.ovfs, synth.source_envelope = gamma, ovfs, self.envelope
         
+        if record is None: record = self.record
         synth.id          = self.id+"-synth"
-        synth.Vs          = self.Vs
+        synth.Vs          = Vs
+        synth.Vs_vars     = self.RecordVars()
         synth.alpha       = self.alpha
         synth.beta        = self.beta
-        synth.timesVs     = np.linspace(0, len(self.s)/self.fs, len(self.s)*ovfs)
+        synth.timesVs     = TimesVs(record, self.T, len(self.s), ovfs)
         
         delattr(self,"alpha"); delattr(self,"beta");
         
-        return synth
\ No newline at end of file
+        return synth
+    
+    #%%
+    @Timed()
+    def Trajectory(self, alpha, beta, gamma, ovfs=20, engine=None, record=None, envelope=None, model="amphibious"):
+        # ------------- BIRD PARAMETERS -----------
+        # - Trachea:
+        #           r: reflection coeficient    [adimensionelss]
+        #           L: trachea length           [m]
+        #           c: speed of sound in media  [m/s]
+        if engine is None:   engine   = self.engine
+        if record is None:   record   = self.record
+        if envelope is None: envelope = self.envelope
+        BirdData   = {"C":3.43E+02, "L":2.50E-02, "r":6.50E-01}
+        integrator = GetEngine(engine, model=model)
+        
+        return integrator(self.f1, self.f2, alpha, beta, gamma, envelope, self.fs, BirdData, ovfs=ovfs,
+                          record=record, record_vars=self.record_vars, record_dtype=self.record_dtype)
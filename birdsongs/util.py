@@ -1,4 +1,4 @@
-import peakutils, time, warnings, lmfit, pickle, copyreg, sys, os #emcee,
+import peakutils, time, warnings, lmfit, pickle, copyreg, sys, os, hashlib, functools, json, tracemalloc, threading #emcee,
 import numpy as np
 import pandas as pd
 import sympy as sym
@@ -6,6 +6,7 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from pathlib import Path
+from collections import OrderedDict
 
 from playsound import playsound
 
@@ -26,6 +27,9 @@ from scipy.signal import argrelextrema, butter, savgol_filter, find_peaks #hilbe
 from scipy.special import comb
 
 from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
 from random import uniform
 from multiprocessing import Pool
 from IPython.display import display as Display
@@ -48,9 +52,32 @@ import plotly
 
 from IPython.display import Audio # reproduce audio 
 
-Pool() # crea pool to parallel programming for optimization
 #warnings.filterwarnings(action='once') # omite warnings spam
 
+# on-disk cache of expensive results (bifurcation curves, ...), it can be moved with BIRDSONGS_CACHE
+CACHE_DIR = Path(os.environ.get("BIRDSONGS_CACHE", Path.home() / ".cache" / "birdsongs"))
+
+# dtypes of the audio, spectral features, synthetic signals and recorded trajectories (see SetPrecision),
+# None keeps the dtypes of the inputs (librosa loads float32 audio). The motor gestures integration
+# (state, alpha, beta, envelope) always runs in float64. The STFT and MFCC dtypes follow the signal
+# (complex64 for float32)
+PRECISION = {"float":None}
+
+def SetPrecision(precision=None):
+    """
+    Precision of the objects created afterwards: None (default, the dtypes of the loaded audio and of
+    librosa), "float32", which halves the memory of float64 signals, STFTs (complex64), reassigned
+    spectrograms, mel and MFCC arrays and Vs, or "float64"
+    """
+    if precision not in (None, "float32", "float64"): 
+        raise ValueError("Unknown precision '{}', use None, 'float32' or 'float64'.".format(precision))
+    PRECISION["float"] = None if precision is None else np.dtype(precision).type
+    return precision
+
+def AsPrecision(x):
+    # x with the dtype of SetPrecision, the same array without precision
+    return x if PRECISION["float"] is None else np.asarray(x).astype(PRECISION["float"], copy=False)
+
 #%%
 def PrintPretty(s): Display(Latex(s))
 #%%
@@ -69,6 +96,22 @@ def rk4(f, v, dt):
     k3 = f(v + dt/2.0*k2)
     k4 = f(v + dt*k3)
     return v + dt*(2.0*(k2+k3)+k1+k4)/6.0
+#%%
+def NormRows(x, ord=2):
+    """
+    Norm of each row of a 2D array, same numbers as Norm(x[i], ord) row by row
+    INPUT:
+        x   = (N x M) real or complex array, one vector per row
+        ord = order of the norm (as numpy.linalg.norm)
+    OUTPUT:
+        (N,) array with the norm of each row
+    """
+    x = np.ascontiguousarray(x)
+    if ord!=2: return Norm(x, ord=ord, axis=1)
+    # ord=2 of a vector is computed by Norm with dot products of the real and imaginary parts
+    vecdot = getattr(np, "vecdot", lambda a, b: np.einsum("ij,ij->i", a, b))
+    if np.iscomplexobj(x): return np.sqrt(vecdot(x.real, x.real) + vecdot(x.imag, x.imag))
+    else:                  return np.sqrt(vecdot(x, x))
 
 #%%
 def WriteAudio(name, fs, s):
@@ -81,7 +124,7 @@ def Enve(out, fs, Nt):
     t_env = np.arange(0,len(out_env),1)*len(out)/fs/len(out_env)
     t_env[-1] = time[-1] 
     fun_s = interp1d(t_env, out_env)
-    return fun_s(time)
+    return np.asarray(fun_s(time), dtype=np.float64)   # input of the integration, also for float32 signals
 
 #%%
 def AudioPlay(obj):
@@ -219,30 +262,111 @@ def DownloadXenoCanto(data, XC_ROOTDIR="./examples/", XC_DIR="Audios/", filters=
         raise ValueError("No sounds were found with your specifications. Try again with other parameters.")
 
 #%%
-def BifurcationODE(f1, f2):
+_BIFURCATIONS = {} # in-process cache of BifurcationODE, (f1, f2) -> (beta_bif, mu1_curves, f1, f2)
+
+def BifurcationODE(f1, f2, cache=True):
+        """
+        Saddle-node bifurcation curves and lambdified labia ODEs of the (f1, f2) system
+        INPUT:
+            f1, f2 = string expressions of x'=f1 and y'=f2 in xs, ys, alpha, beta, gamma
+            cache  = reuse the results of the same (f1, f2) pair, in-process and on disk (CACHE_DIR)
+        OUTPUT:
+            beta_bif   = beta values of the curves
+            mu1_curves = alpha values of the saddle-node curves, one array per branch
+            f1, f2     = lambdified functions f(x, y, alpha, beta, gamma)
+        """
+        if cache and (f1, f2) in _BIFURCATIONS: return _BIFURCATIONS[(f1, f2)]
+        
         #st = 'x, y, alpha, beta, gamma'
         #exec("st=sym.symbols('x y alpha beta gamma')")
         beta_bif = np.linspace(-2.5, 1/3, 1000)  # mu2:beta,  mu1:alpha
         xs, ys, alpha, beta, gamma = sym.symbols('x y alpha beta gamma')
         # ---------------- Labia EDO's Bifurcation -----------------------
-        f1 = eval(f1)#ys
-        f2 = eval(f2)#(-alpha-beta*xs-xs**3+xs**2)*gamma**2 -(xs+1)*gamma*xs*ys
-        x01 = sym.solveset(f1, ys)+sym.solveset(f1, xs) # find root f1
-        f2_x01 = f2.subs(ys,x01.args[0])                # f2(root f1)
-        f  = sym.solveset(f2_x01, alpha)                # root f2 at root f1, alpha=f(x,beta)
-        g  = alpha                                      # g(x) = alpha, above
-        df = f.args[0].diff(xs)                         # f'(x)
-        dg = g.diff(xs)                                 # g'(x)
-        roots_bif = sym.solveset(df-dg, xs)             # bifurcation roots sets (xmin, xmas)
-        mu1_curves = [] 
-        for ff in roots_bif.args:                       # roots as arguments (expr)
-            x_root = np.array([float(ff.subs(beta, mu2)) for mu2 in beta_bif], dtype=float)    # root evaluatings beta
-            mu1    = np.array([f.subs([(beta,beta_bif[i]),(xs,x_root[i])]).args[0] for i in range(len(beta_bif))], dtype=float)
-            mu1_curves.append(mu1)
-        f1 = sym.lambdify([xs, ys, alpha, beta, gamma], f1)
-        f2 = sym.lambdify([xs, ys, alpha, beta, gamma], f2)
-
-        return beta_bif, mu1_curves, f1, f2
+        F1 = eval(f1)#ys
+        F2 = eval(f2)#(-alpha-beta*xs-xs**3+xs**2)*gamma**2 -(xs+1)*gamma*xs*ys
+        
+        file = CACHE_DIR / "bifurcation-{}.npz".format(hashlib.sha1((f1+"|"+f2).encode()).hexdigest()[:16])
+        if cache and file.exists():
+            data       = np.load(file)
+            beta_bif   = data["beta_bif"]
+            mu1_curves = list(data["mu1_curves"])
+        else:
+            x01 = sym.solveset(F1, ys)+sym.solveset(F1, xs) # find root f1
+            f2_x01 = F2.subs(ys,x01.args[0])                # f2(root f1)
+            f  = sym.solveset(f2_x01, alpha)                # root f2 at root f1, alpha=f(x,beta)
+            g  = alpha                                      # g(x) = alpha, above
+            df = f.args[0].diff(xs)                         # f'(x)
+            dg = g.diff(xs)                                 # g'(x)
+            roots_bif = sym.solveset(df-dg, xs)             # bifurcation roots sets (xmin, xmas)
+            mu1_fun   = sym.lambdify([xs, beta], f.args[0], "numpy")
+            mu1_curves = [] 
+            for ff in roots_bif.args:                       # roots as arguments (expr)
+                # root and alpha evaluated over all beta values at once
+                x_root = np.broadcast_to(sym.lambdify(beta, ff, "numpy")(beta_bif), beta_bif.shape).astype(float)
+                mu1    = np.broadcast_to(mu1_fun(x_root, beta_bif), beta_bif.shape).astype(float)
+                mu1_curves.append(mu1)
+            if cache:
+                try:
+                    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    np.savez(file, beta_bif=beta_bif, mu1_curves=np.array(mu1_curves))
+                except OSError: pass                        # read-only cache, keep going without it
+        f1_fun = sym.lambdify([xs, ys, alpha, beta, gamma], F1)
+        f2_fun = sym.lambdify([xs, ys, alpha, beta, gamma], F2)
+        
+        if cache: _BIFURCATIONS[(f1, f2)] = (beta_bif, mu1_curves, f1_fun, f2_fun)
+        return beta_bif, mu1_curves, f1_fun, f2_fun
+
+_FREQUENCIES = {} # in-process cache of FrequencyMap
+
+def FrequencyMap(f1, f2, alphas=np.linspace(0, 0.5, 26), betas=np.linspace(-1.5, 1.5, 61), cache=True):
+        """
+        Oscillation frequency of the labia ODEs over an (alpha, beta) grid. With time in units
+        of 1/gamma (gamma=1) the frequency does not depend on gamma, at gamma it is gamma*freqs Hz
+        INPUT:
+            f1, f2        = string expressions of x'=f1 and y'=f2 (as BifurcationODE)
+            alphas, betas = grid values
+            cache         = reuse the map of the same inputs, in-process and on disk (CACHE_DIR)
+        OUTPUT:
+            alphas, betas = grid values
+            freqs         = (alphas x betas) frequencies, nan where the labia do not oscillate
+        """
+        key = hashlib.sha1("|".join([f1, f2, repr(np.asarray(alphas).tolist()), repr(np.asarray(betas).tolist())]).encode()).hexdigest()[:16]
+        if cache and key in _FREQUENCIES: return _FREQUENCIES[key]
+        
+        file = CACHE_DIR / "frequencies-{}.npz".format(key)
+        if cache and file.exists():
+            freqs = np.load(file)["freqs"]
+        else:
+            _, _, f1_fun, f2_fun = BifurcationODE(f1, f2, cache=cache)
+            alpha, beta = np.meshgrid(alphas, betas, indexing="ij")
+            f = lambda v: np.array([f1_fun(v[0], v[1], alpha, beta, 1.), f2_fun(v[0], v[1], alpha, beta, 1.)])
+            # all the grid at once: rk4 transient, then the upward zero crossings of y (minima of x)
+            dt, transient, steps = 0.05, 4000, 8000
+            v     = np.full((2,)+alpha.shape, 0.01)
+            count = np.zeros(alpha.shape);  first, last = np.full(alpha.shape, np.nan), np.full(alpha.shape, np.nan)
+            x_min, x_max = np.full(alpha.shape, np.inf), np.full(alpha.shape, -np.inf)
+            with np.errstate(all="ignore"):
+                for i in range(transient+steps):
+                    w = rk4(f, v, dt)
+                    if i>=transient:
+                        up    = (v[1]<0) & (w[1]>=0)
+                        t     = (i + v[1]/(v[1]-w[1]))*dt
+                        first = np.where(up & np.isnan(first), t, first)
+                        last  = np.where(up, t, last)
+                        count += up
+                        x_min, x_max = np.fmin(x_min, w[0]), np.fmax(x_max, w[0])
+                    v = w
+                oscillating = (count>=2) & (x_max-x_min>1e-2) & (np.abs(x_min)<10) & (np.abs(x_max)<10)
+                freqs = np.where(oscillating, (count-1)/(last-first), np.nan)
+            if cache:
+                try:
+                    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    np.savez(file, freqs=freqs)
+                except OSError: pass                        # read-only cache, keep going without it
+        
+        result = (np.asarray(alphas, dtype=float), np.asarray(betas, dtype=float), freqs)
+        if cache: _FREQUENCIES[key] = result
+        return result
 
 # def Enve(self, out, fs, Nt):
 #     time = np.linspace(0, len(out)/fs, len(out))
@@ -252,6 +376,324 @@ def BifurcationODE(f1, f2):
 #     fun_s = interp1d(t_env, out_env)
 #     return fun_s(time)
 
+#%%
+class SolveCache(object):
+    """
+    Bounded LRU cache of motor gestures integrations (synthetic signals), keyed by a hash of the
+    inputs: alpha and beta (syllable samples and parameters), gamma, envelope, model constants, ...
+    INPUT:
+        maxsize  = maximum number of signals kept in memory, the least recently used is dropped
+        maxbytes = maximum memory of the kept signals (64 MB), the least recently used are dropped and a
+                   larger signal (a whole song) is not kept in memory
+        persist = also save the signals in path and look for them there, so other runs reuse them
+        path    = folder of the persisted signals, CACHE_DIR/solve by default
+    """
+    def __init__(self, maxsize=256, maxbytes=2**26, persist=False, path=None):
+        self.maxsize  = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes   = 0                  # memory of the kept signals
+        self.persist = persist
+        self.path    = Path(path) if path is not None else CACHE_DIR / "solve"
+        self.data    = OrderedDict()
+        self.hits, self.misses = 0, 0
+        self.lock    = threading.RLock()   # Get and Put from several threads (SolveReference)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]                  # locks can't be pickled, each copy has its own
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def Key(*args):
+        # sha1 of the arrays bytes and the other values representation
+        key = hashlib.sha1()
+        for arg in args:
+            if isinstance(arg, np.ndarray): key.update(np.ascontiguousarray(arg).tobytes()); key.update(str(arg.shape).encode())
+            elif isinstance(arg, dict):     key.update(repr(sorted(arg.items())).encode())
+            else:                           key.update(repr(arg).encode())
+            key.update(b"|")
+        return key.hexdigest()
+    
+    def Get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key);  self.hits += 1
+                return self.data[key].copy()
+            if self.persist and (self.path / (key+".npy")).exists():
+                try:
+                    value = np.load(self.path / (key+".npy"))
+                    self.Put(key, value, save=False);  self.hits += 1
+                    return value.copy()
+                except (OSError, ValueError): pass
+            self.misses += 1
+            return None
+    
+    def Put(self, key, value, save=True):
+        with self.lock:
+            value = np.array(value)
+            if key in self.data: self.nbytes -= self.data.pop(key).nbytes
+            if value.nbytes <= self.maxbytes:
+                self.data[key] = value;  self.nbytes += value.nbytes
+            while len(self.data) > self.maxsize or self.nbytes > self.maxbytes:
+                self.nbytes -= self.data.popitem(last=False)[1].nbytes
+            if self.persist and save:
+                try:
+                    self.path.mkdir(parents=True, exist_ok=True)
+                    np.save(self.path / (key+".npy"), value)
+                except OSError: pass                        # read-only cache, keep going in memory
+    
+    def Clear(self, disk=False):
+        with self.lock: self.data.clear();  self.nbytes, self.hits, self.misses = 0, 0, 0
+        if disk and self.path.exists():
+            for file in self.path.glob("*.npy"): file.unlink()
+    
+    def __len__(self): return len(self.data)
+
+# cache shared by the Syllables created with cache=True (default)
+SOLVE_CACHE = SolveCache()
+
+#%%
+_PROFILERS = []   # active Profilers, innermost last
+
+class Profiler(object):
+    """
+    Instrumentation of the pipeline stages (Timed functions: Solve, MotorGestures, SynthScores,
+    acoustic features, Optimal*, SongByTimes, ...) and events (cache hits, skipped candidates)
+    run inside `with Profiler() as profiler:`. Times are inclusive (a stage contains the stages
+    it calls) and only the current process is seen (not the Pool or brute grid workers)
+    INPUT:
+        memory = trace the peak memory allocated inside the block (tracemalloc, slower)
+        hook   = function called with each record as it is added
+    """
+    def __init__(self, memory=False, hook=None):
+        self.memory  = memory
+        self.hook    = hook
+        self.records = []      # {"stage", "start", "seconds", "calls"} per stage call or event
+        self.peak_memory = None
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.memory:
+            self.tracing = tracemalloc.is_tracing()
+            if not self.tracing:                    tracemalloc.start()
+            elif hasattr(tracemalloc, "reset_peak"): tracemalloc.reset_peak()
+            else: tracemalloc.stop(); tracemalloc.start()   # python 3.8, no reset_peak
+        _PROFILERS.append(self)
+        return self
+    
+    def __exit__(self, *exc):
+        _PROFILERS.remove(self)
+        self.seconds = time.perf_counter()-self.start
+        if self.memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if not self.tracing: tracemalloc.stop()
+        return False
+    
+    def Add(self, stage, start, seconds):
+        record = {"stage":stage, "start":start-self.start, "seconds":seconds}
+        self.records.append(record)
+        if self.hook is not None: self.hook(record)
+    
+    def Summary(self):
+        # calls, total, mean and max seconds per stage, events have 0 seconds
+        df = pd.DataFrame(self.records, columns=["stage", "start", "seconds"])
+        return df.groupby("stage")["seconds"].agg(calls="count", total="sum", mean="mean", max="max").sort_values("total", ascending=False)
+    
+    def CacheHitRate(self):
+        hits, misses = [sum(r["stage"]==event for r in self.records) for event in ("cache hit", "cache miss")]
+        return hits/(hits+misses) if hits+misses!=0 else np.nan
+    
+    def ToCSV(self, file):
+        pd.DataFrame(self.records, columns=["stage", "start", "seconds"]).to_csv(file, index=False)
+    
+    def ToJSON(self, file=None):
+        summary = self.Summary()
+        data = {"seconds":getattr(self, "seconds", None), "peak_memory":self.peak_memory,
+                "cache_hit_rate":None if np.isnan(self.CacheHitRate()) else self.CacheHitRate(),
+                "summary":{stage:{key:float(value) for key, value in row.items()} for stage, row in summary.iterrows()},
+                "records":self.records}
+        if file is None: return json.dumps(data)
+        with open(file, "w") as f: json.dump(data, f, indent=1)
+
+def Timed(stage=None):
+    # decorator, the calls of the function are a stage of the active Profilers (qualified name by default)
+    def decorator(function):
+        name = stage if stage is not None else function.__qualname__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if len(_PROFILERS)==0: return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:     return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter()-start
+                for profiler in _PROFILERS: profiler.Add(name, start, seconds)
+        return wrapper
+    return decorator
+
+def Event(stage):
+    # count an event (0 seconds stage) in the active Profilers
+    for profiler in _PROFILERS: profiler.Add(stage, time.perf_counter(), 0.)
+
+#%%
+class FitDatabase(object):
+    """
+    Store of fitted motor gestures coefficients indexed by the acoustic descriptors of their
+    syllables (Syllable.Descriptors), to start the optimization of a new syllable from the fits
+    of the most similar ones
+    INPUT:
+        file = .npz saved by Save to load, None starts an empty database
+        k    = number of nearest fits used by Apply
+    """
+    DESCRIPTORS = ["FF_mean", "FF_std", "FF_slope", "duration", "bandwidth"]
+    COEFS       = ["a0", "a1", "a2", "b0", "b1", "b2", "gm"]
+    
+    def __init__(self, file=None, k=5):
+        self.k           = k
+        self.descriptors = np.zeros((0, len(self.DESCRIPTORS)))
+        self.coefs       = np.zeros((0, len(self.COEFS)))
+        self.names       = []
+        if file is not None: self.Load(file)
+    
+    def __len__(self): return len(self.names)
+    
+    def Add(self, syllable, p=None, name=None):
+        # fit p (syllable.p by default) of the syllable
+        if p is None:    p = syllable.p
+        if name is None: name = "{}-{}".format(syllable.file_name, syllable.no_syllable)
+        self.descriptors = np.vstack([self.descriptors, syllable.Descriptors()])
+        self.coefs       = np.vstack([self.coefs, [p[coef].value for coef in self.COEFS]])
+        self.names.append(str(name))
+    
+    @classmethod
+    def FromPaths(cls, paths, flim=(1e2,15e3), **kwargs):
+        # database of the fits exported to paths.MG_param (Syllable.ExportMotorGestures),
+        # the syllables are rebuilt as in DefineSyllable
+        database = cls(**kwargs)
+        df = paths.ImportParameters()
+        for i in range(len(df.index)):
+            row      = df.iloc[i]
+            birdsong = bs.BirdSong(paths, file_id=row["id_XC"], umbral_FF=row["umbral_FF"], tlim=(0,60), Nt=1000, NN=row["NN"], flim=flim)
+            syllable = bs.Syllable(birdsong=birdsong, tlim=row[["t_ini","t_end"]].values, Nt=10, umbral_FF=row["umbral_FF"],
+                                   ide="syllable", type=row["type"], no_syllable=row["no_syllable"])
+            syllable.Set(row["coef"])
+            database.Add(syllable, name="{}-{}".format(row["file_name"], row["no_syllable"]))
+        return database
+    
+    def Nearest(self, syllable, k=None):
+        # DataFrame with the k nearest fits to the syllable, distance over the standardized descriptors
+        if k is None: k = self.k
+        if len(self)==0: raise ValueError("The database is empty, Add fits or load them (FromPaths, Load)")
+        scale    = self.descriptors.std(axis=0)
+        scale[scale==0] = 1
+        distance = Norm((self.descriptors-syllable.Descriptors())/scale, axis=1)
+        nearest  = np.argsort(distance)[:k]
+        df = pd.DataFrame(self.coefs[nearest], columns=self.COEFS)
+        df.insert(0, "name", [self.names[i] for i in nearest])
+        df["distance"] = distance[nearest]
+        return df
+    
+    def Apply(self, syllable, k=None, bounds=False, margin=0.1, coefs=("a0","a1","a2","b0","b1","b2")):
+        # set the syllable.p coefs to the median of the k nearest fits. bounds=True also narrows
+        # their bounds to the range of those fits, widened by margin times the original range
+        nearest = self.Nearest(syllable, k)
+        for coef in coefs:
+            values    = nearest[coef].values
+            low, high = syllable.p[coef].min, syllable.p[coef].max
+            value     = float(np.clip(np.median(values), low, high))
+            if bounds:
+                pad = margin*(high-low)
+                syllable.p[coef].set(min=float(max(min(values.min(), value)-pad, low)),
+                                     max=float(min(max(values.max(), value)+pad, high)), value=value)
+            else:
+                syllable.p[coef].set(value=value)
+        return nearest
+    
+    def Save(self, file):
+        np.savez(file, descriptors=self.descriptors, coefs=self.coefs, names=np.array(self.names))
+    
+    def Load(self, file):
+        with np.load(file) as data:
+            self.descriptors, self.coefs, self.names = data["descriptors"], data["coefs"], [str(name) for name in data["names"]]
+
+#%%
+class InferenceModel(object):
+    """
+    Regressor from the features of a syllable (Syllable.FeatureVector) to its motor gestures
+    coefficients, trained on synthetic syllables of random coefficients (Simulate, Fit). Predict
+    takes milliseconds, Apply sets the prediction in a syllable (also as Optimizer warm_start
+    to refine it with a local method)
+    INPUT:
+        regressor = sklearn regressor with multiple outputs, a scaled random forest by default
+        file      = model saved by Save to load
+    """
+    COEFS = ["a0", "a1", "a2", "b0", "b1", "b2", "gm"]
+    
+    def __init__(self, regressor=None, file=None):
+        if regressor is None: regressor = make_pipeline(StandardScaler(), RandomForestRegressor(n_estimators=200, n_jobs=-1))
+        self.regressor = regressor
+        self.features  = None                             # (N x features) training inputs
+        self.coefs     = np.zeros((0, len(self.COEFS)))   # (N x 7) training coefficients
+        if file is not None: self.Load(file)
+    
+    def Simulate(self, syllable, n=1000, batch=50, seed=None, engine=None):
+        # add n synthetic syllables with uniform random coefficients within the syllable.p bounds,
+        # solved batch at a time (Syllable.SolveBatch). Silent draws (Syllable.Oscillating) are
+        # skipped before solving, so fewer than n can be added
+        rng    = np.random.default_rng(seed)
+        low    = np.array([syllable.p[coef].min for coef in self.COEFS])
+        high   = np.array([syllable.p[coef].max for coef in self.COEFS])
+        draws  = rng.uniform(low, high, size=(n, len(self.COEFS)))
+        if syllable.s.size < 2*syllable.fs/100: syllable.id = "chunck"
+        else:                                   syllable.id = "syllable"
+        alpha, beta = syllable.AlphaBeta(draws[:,:6])
+        draws  = draws[syllable.Oscillating(alpha, beta).any(axis=1)]
+        
+        features, coefs = [], []
+        for i in range(0, draws.shape[0], batch):
+            outs, _ = syllable.SolveBatch(draws[i:i+batch], engine=engine, scores=[])
+            for out, draw in zip(outs, draws[i:i+batch]):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    x = syllable.SynthSyllable(out).FeatureVector()
+                if np.all(np.isfinite(x)): features.append(x);  coefs.append(draw)
+        
+        features = np.array(features).reshape(len(coefs), -1)
+        self.features = features if self.features is None else np.vstack([self.features, features])
+        self.coefs    = np.vstack([self.coefs, np.array(coefs).reshape(-1, len(self.COEFS))])
+        return features.shape[0]
+    
+    def Fit(self):
+        self.regressor.fit(self.features, self.coefs)
+        return self
+    
+    def Predict(self, syllable):
+        # predicted coefficients of the syllable, as a {coef: value} dict
+        return dict(zip(self.COEFS, self.regressor.predict(syllable.FeatureVector()[np.newaxis])[0].tolist()))
+    
+    def Apply(self, syllable, bounds=False, margin=0.1, coefs=("a0","a1","a2","b0","b1","b2")):
+        # set the syllable.p coefs to the prediction (within the bounds). bounds=True also narrows
+        # their bounds around it, margin times the original range at each side
+        prediction = self.Predict(syllable)
+        for coef in coefs:
+            low, high = syllable.p[coef].min, syllable.p[coef].max
+            value     = float(np.clip(prediction[coef], low, high))
+            if bounds:
+                pad = margin*(high-low)
+                syllable.p[coef].set(min=float(max(value-pad, low)), max=float(min(value+pad, high)), value=value)
+            else:
+                syllable.p[coef].set(value=value)
+        return prediction
+    
+    def Save(self, file):
+        with open(file, "wb") as f: pickle.dump({"regressor":self.regressor, "features":self.features, "coefs":self.coefs}, f)
+    
+    def Load(self, file):
+        with open(file, "rb") as f: data = pickle.load(f)
+        self.regressor, self.features, self.coefs = data["regressor"], data["features"], data["coefs"]
+
 #%%
 def DefineWholeSyllable(paths, df, index, flim=(1e2,15e3)):
     
@@ -22,6 +22,7 @@ def show_versions():
     core_deps = [   "librosa",
                     "lmfit",
                     "scipy",
+                    "numba",
                     "sympy",
                     "numpy",
                     "pandas",
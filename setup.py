@@ -46,6 +46,7 @@ setup(
                             "librosa",
                             "lmfit",
                             "scipy",
+                            "numba",
                             "sympy",
                             "numpy",
                             "pandas",